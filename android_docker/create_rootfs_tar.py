@@ -17,6 +17,7 @@ import hashlib
 import tarfile
 import gzip
 import time
+import functools
 from pathlib import Path
 from urllib.parse import urlparse
 import platform
@@ -25,6 +26,32 @@ import platform
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# tar exit code 2 reports warnings (usually hard link failures) after the files were extracted
+_TAR_ACCEPTABLE_EXIT_CODES = frozenset({0, 2})
+# Copy buffer for the Python tarfile fallback; the 16 KiB default means many small reads per member
+_TAR_COPY_BUFSIZE = 1 << 20
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_android():
+    """Probe Android/Termux indicators, cheapest first; the answer is fixed for the process"""
+    is_android = (
+        os.environ.get('ANDROID_DATA') is not None
+        or os.environ.get('TERMUX_VERSION') is not None
+        or 'com.termux' in os.environ.get('PREFIX', '')
+        or '/data/data/com.termux' in os.getcwd()
+        or os.path.exists('/system/build.prop')
+        or os.path.exists('/data/data/com.termux')
+    )
+    if is_android:
+        logger.debug("Detected Android/Termux environment")
+    return is_android
+
+
+def _is_whiteout(name):
+    """Check whether a layer member is an OCI whiteout entry (.wh. prefix on any path component)"""
+    return name.startswith('.wh.') or '/.wh.' in name
+
 class DockerRegistryClient:
     """Docker Registry API client, downloads images using curl"""
 
@@ -823,20 +850,21 @@ class DockerImageToRootFS:
             if magic == b'\x1f\x8b':  # gzip magic number
                 # This is a gzip-compressed tar file
                 with gzip.open(layer_path, 'rb') as gz_file:
-                    with tarfile.open(fileobj=gz_file, mode='r|*') as tar:
+                    with tarfile.open(fileobj=gz_file, mode='r|*', bufsize=_TAR_COPY_BUFSIZE,
+                                      copybufsize=_TAR_COPY_BUFSIZE) as tar:
                         self._safe_extract_tar(tar, rootfs_dir)
             else:
                 # Try as regular tar file
-                with tarfile.open(layer_path, 'r') as tar:
+                with tarfile.open(layer_path, 'r', copybufsize=_TAR_COPY_BUFSIZE) as tar:
                     self._safe_extract_tar(tar, rootfs_dir)
         except Exception as e:
             # If streaming read fails, try non-streaming
             logger.debug(f"Streaming extraction failed, trying non-streaming: {e}")
             if magic == b'\x1f\x8b':
-                with tarfile.open(layer_path, 'r:gz') as tar:
+                with tarfile.open(layer_path, 'r:gz', copybufsize=_TAR_COPY_BUFSIZE) as tar:
                     self._safe_extract_tar(tar, rootfs_dir)
             else:
-                with tarfile.open(layer_path, 'r') as tar:
+                with tarfile.open(layer_path, 'r', copybufsize=_TAR_COPY_BUFSIZE) as tar:
                     self._safe_extract_tar(tar, rootfs_dir)
 
     def _safe_extract_tar(self, tar, rootfs_dir):
@@ -848,7 +876,7 @@ class DockerImageToRootFS:
             nonlocal whiteout_count
             
             # Skipping whiteout file
-            if member.name.startswith('.wh.') or '/.wh.' in member.name:
+            if _is_whiteout(member.name):
                 logger.debug(f"Skipping whiteout file: {member.name}")
                 whiteout_count += 1
                 return None
@@ -980,21 +1008,7 @@ class DockerImageToRootFS:
 
     def _is_android_environment(self):
         """Detect if running in Android environment (enhanced version)"""
-        android_indicators = [
-            '/data/data/com.termux' in os.getcwd(),
-            os.path.exists('/system/build.prop'),
-            os.environ.get('ANDROID_DATA') is not None,
-            os.environ.get('TERMUX_VERSION') is not None,
-            os.path.exists('/data/data/com.termux'),
-            'com.termux' in os.environ.get('PREFIX', ''),
-        ]
-
-        is_android = any(android_indicators)
-
-        if is_android:
-            logger.debug("Detected Android/Termux environment")
-
-        return is_android
+        return _detect_android()
 
     def _validate_critical_files(self, rootfs_dir):
         """Validate if critical files exist (relaxed mode, warnings only)"""
@@ -1097,17 +1111,16 @@ class DockerImageToRootFS:
         try:
             result = subprocess.run(cmd, capture_output=True, text=True)
             
-            if result.returncode == 0:
+            if result.returncode not in _TAR_ACCEPTABLE_EXIT_CODES:
+                # Other error codes, try fallback
+                logger.warning(f"tar command failed (exit code{result.returncode}), trying relaxed mode")
+                self._extract_with_fallback(base_cmd, rootfs_dir)
+            elif result.returncode == 0:
                 logger.debug("tar extraction successful")
-            elif result.returncode == 2:
-                # tar exit code 2 usually indicates warnings (like hard link failures), but files are extracted
+            else:
                 logger.info("tar extraction completed (with warnings, but files extracted)")
                 if self._is_android_environment():
                     logger.debug("Android environment: Ignoring hard link related warnings")
-            else:
-                # Other error codes, try fallback
-                logger.warning(f"tar command failed (exit code{result.returncode}), trying relaxed mode")
-                self._extract_with_fallback(base_cmd, rootfs_dir)
         except Exception as e:
             logger.warning(f"tar command exception: {e}, trying relaxed mode")
             self._extract_with_fallback(base_cmd, rootfs_dir)
@@ -1128,8 +1141,7 @@ class DockerImageToRootFS:
 
         if result.returncode == 0:
             logger.info("Extraction successful with relaxed mode")
-        elif result.returncode == 2:
-            # tar exit code 2 indicates warnings but partial success (usually hard link issues)
+        elif result.returncode in _TAR_ACCEPTABLE_EXIT_CODES:
             logger.info("tar extraction completed (with warnings, but most files extracted)")
             if self._is_android_environment():
                 logger.info("Android environment: Hard link errors ignored, container should run normally")
@@ -1278,7 +1290,7 @@ class DockerImageToRootFS:
         logger.info("Note: This script only requires curl and tar command-line tools, no need for skopeo, umoci and requests library")
         logger.info("Uses Python standard library for image unpacking, suitable for running in various environments")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description='Create Docker image root filesystem tar package using curl and Python'
     )
@@ -1315,7 +1327,7 @@ def main():
         help='Specify target architecture (e.g., amd64, arm64). Defaults to auto-detect.'
     )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -21,6 +21,7 @@ from urllib.parse import urlparse
 # Import existing modules
 from .proot_runner import ProotRunner
 from .create_rootfs_tar import DockerImageToRootFS
+from .exec_session import ExecSession, EXEC_SESSION_ENV, stdin_is_idle
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -653,25 +654,28 @@ class DockerCLI:
         if not isinstance(command, list):
             command = [str(command)] if command else ['/bin/sh']
 
+        logger.info(f"Executing command in container {container_id}: {' '.join(command)}")
+
+        env = os.environ.copy()
+        # Remove LD_PRELOAD for Android Termux compatibility
+        if 'LD_PRELOAD' in env:
+            del env['LD_PRELOAD']
+
+        # The session runs commands with stdin on /dev/null; piped input needs the one-shot path.
+        if not interactive and self._exec_session_enabled() and stdin_is_idle():
+            session_result = self._exec_in_session(container_dir, rootfs_dir, proot_cmd, command, env)
+            if session_result is not None:
+                return session_result
+
         # Add the command to execute
         proot_cmd.extend(command)
 
-        logger.info(f"Executing command in container {container_id}: {' '.join(command)}")
-        
         try:
             if interactive:
                 # Interactive mode: connect stdin/stdout/stderr
-                env = os.environ.copy()
-                # Remove LD_PRELOAD for Android Termux compatibility
-                if 'LD_PRELOAD' in env:
-                    del env['LD_PRELOAD']
                 subprocess.run(proot_cmd, env=env)
             else:
                 # Non-interactive mode: capture output
-                env = os.environ.copy()
-                # Remove LD_PRELOAD for Android Termux compatibility
-                if 'LD_PRELOAD' in env:
-                    del env['LD_PRELOAD']
                 result = subprocess.run(proot_cmd, env=env, capture_output=True, text=True)
                 if result.stdout:
                     print(result.stdout, end='')
@@ -683,6 +687,49 @@ class DockerCLI:
             logger.error(f"Failed to execute command: {e}")
             return False
 
+    def _exec_session_enabled(self):
+        """Whether non-interactive exec should go through a persistent session (opt-in)"""
+        return self.runner._parse_env_bool(os.environ.get(EXEC_SESSION_ENV)) is True
+
+    def _exec_in_session(self, container_dir, rootfs_dir, proot_cmd, command, env):
+        """Run command through the container's persistent exec session.
+
+        Returns the exec result, or None to fall back to a one-shot proot.
+        """
+        session = ExecSession(container_dir)
+        try:
+            if not session.is_running():
+                shell = next(
+                    (s for s in ('/bin/sh', '/bin/bash') if os.path.exists(os.path.join(rootfs_dir, s.lstrip('/')))),
+                    None
+                )
+                if not shell:
+                    return None
+                session.start(proot_cmd, shell, env=env)
+
+            result = session.run(command)
+        except OSError as e:
+            logger.debug(f"Exec session unavailable, falling back to one-shot proot: {e}")
+            return None
+
+        if result is None:
+            return None
+
+        exit_code, output = result
+        if output:
+            sys.stdout.write(output.decode('utf-8', errors='replace'))
+            sys.stdout.flush()
+        return exit_code == 0
+
+    def _stop_exec_session(self, container_dir):
+        """Terminate the container's exec session, if one was started"""
+        if not container_dir:
+            return
+        try:
+            ExecSession(container_dir).stop()
+        except OSError as e:
+            logger.debug(f"Failed to stop exec session: {e}")
+
     def ps(self, all_containers=False):
         """List containers"""
         containers = self._load_containers()
@@ -777,6 +824,9 @@ class DockerCLI:
             
         container_info = containers[container_id]
         pid = container_info.get('pid')
+
+        # Exec sessions must not outlive the container they serve.
+        self._stop_exec_session(container_info.get('container_dir'))
         
         if pid and not self._is_process_running(pid):
             logger.info(f"Container {container_id} process already stopped, updating status to 'exited'")
@@ -869,6 +919,7 @@ class DockerCLI:
                 
         # Clean up container's persistent directory
         container_dir = container_info.get('container_dir')
+        self._stop_exec_session(container_dir)
         if container_dir and os.path.isdir(container_dir):
             try:
                 import shutil
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Persistent exec session for running containers
+Keeps one long-running proot shell per container and relays `docker exec` commands to it through
+named pipes, so repeated execs skip the proot/rootfs startup cost of a fresh process
+"""
+
+import os
+import json
+import stat
+import time
+import fcntl
+import shlex
+import select
+import signal
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Opt-in switch, parsed with ProotRunner._parse_env_bool.
+EXEC_SESSION_ENV = "ANDROID_DOCKER_EXEC_SESSION"
+
+SESSION_DIR_NAME = 'exec_session'
+# Where the host-side session directory is bound inside the container.
+CONTAINER_SESSION_DIR = '/.android-docker-exec'
+END_MARKER = '__ANDROID_DOCKER_EXEC_END__'
+
+# Shell loop run inside the container ($0 is the session directory). Each request line is
+# "<id> <shell-quoted argv>"; the response is the command output (stderr merged) followed by
+# "<END_MARKER> <id> <exit status>". Opening the request pipe read-write keeps it from ever
+# reporting EOF between clients.
+SESSION_LOOP = (
+    'exec 3<>"$0/in" || exit 1\n'
+    'while IFS=" " read -r __id __cmd <&3; do\n'
+    '  { (eval "$__cmd") </dev/null 2>&1; printf "%s %s %s\\n" "' + END_MARKER + '" "$__id" "$?"; } >"$0/out"\n'
+    'done\n'
+)
+
+
+def stdin_is_idle(fd=0):
+    """Whether fd carries no input a command could read: a terminal, /dev/null, an empty file or closed.
+
+    Session commands run with stdin on /dev/null, so anything else (pipes, non-empty files) must
+    take the one-shot path, which forwards stdin.
+    """
+    try:
+        if os.isatty(fd):
+            return True
+        st = os.fstat(fd)
+    except OSError:
+        return True
+    if stat.S_ISREG(st.st_mode):
+        return st.st_size == 0
+    if stat.S_ISCHR(st.st_mode):
+        try:
+            return st.st_rdev == os.stat(os.devnull).st_rdev
+        except OSError:
+            return False
+    return False
+
+
+def _process_start_time(pid):
+    """Start time of pid in clock ticks since boot (field 22 of /proc/<pid>/stat), or None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat_line = f.read()
+    except OSError:
+        return None
+    # comm (field 2) may contain spaces and parentheses; the remaining fields follow the last ')'.
+    fields = stat_line[stat_line.rfind(b')') + 2:].split()
+    try:
+        return int(fields[19])
+    except (IndexError, ValueError):
+        return None
+
+
+class ExecSession:
+    """Long-running proot shell serving exec requests for one container"""
+
+    START_TIMEOUT = 10
+    POLL_INTERVAL_MS = 500
+
+    def __init__(self, container_dir):
+        self.session_dir = os.path.join(container_dir, SESSION_DIR_NAME)
+        self.request_fifo = os.path.join(self.session_dir, 'in')
+        self.response_fifo = os.path.join(self.session_dir, 'out')
+        self.state_file = os.path.join(self.session_dir, 'session.json')
+        self.lock_file = os.path.join(self.session_dir, 'lock')
+        self._process = None
+
+    def _load_pid(self):
+        """Read the session pid from the state file, if that process is still the session shell.
+
+        The state file outlives the session (OOM kill, reboot), and its pid may since have been
+        reused; the recorded start time tells the two apart.
+        """
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            pid = int(state['pid'])
+            start_time = state['start_time']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if start_time is None or _process_start_time(pid) != start_time:
+            return None
+        return pid
+
+    def is_running(self):
+        """Check whether the session shell is alive"""
+        if self._process is not None:
+            return self._process.poll() is None
+        return self._load_pid() is not None
+
+    def _session_command(self, proot_cmd, shell):
+        """Build the argv that starts the session shell inside the container"""
+        return list(proot_cmd) + [
+            '-b', f'{self.session_dir}:{CONTAINER_SESSION_DIR}',
+            shell, '-c', SESSION_LOOP, CONTAINER_SESSION_DIR,
+        ]
+
+    def start(self, proot_cmd, shell, env=None):
+        """Spawn the session shell.
+
+        Args:
+            proot_cmd: proot invocation (flags, rootfs, binds, workdir) without the command
+            shell: POSIX shell path inside the container
+            env: Environment for the proot process
+        """
+        self.stop()
+        os.makedirs(self.session_dir, exist_ok=True)
+        for path in (self.request_fifo, self.response_fifo):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            os.mkfifo(path, 0o600)
+
+        self._process = subprocess.Popen(
+            self._session_command(proot_cmd, shell),
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with open(self.state_file, 'w') as f:
+            json.dump({'pid': self._process.pid, 'start_time': _process_start_time(self._process.pid)}, f)
+
+        logger.debug(f"Exec session started, PID: {self._process.pid}")
+        return self._process.pid
+
+    def stop(self):
+        """Terminate the session shell (if any) and forget its state"""
+        pid = self._process.pid if self._process is not None else self._load_pid()
+        if pid and self.is_running():
+            try:
+                # The session runs in its own process group; make sure the pid still leads it.
+                if os.getpgid(pid) == pid:
+                    os.killpg(pid, signal.SIGTERM)
+                    logger.debug(f"Exec session stopped, PID: {pid}")
+            except OSError:
+                pass
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                pass
+            self._process = None
+
+        try:
+            os.remove(self.state_file)
+        except FileNotFoundError:
+            pass
+
+    def run(self, command):
+        """Run a command in the session.
+
+        Returns:
+            (exit_code, output_bytes), or None when the request could not be delivered and the
+            caller should fall back to a one-shot proot. Once delivered, the command is never
+            reported as undeliverable, so it cannot run twice.
+        """
+        # The request protocol is line based.
+        if not command or any('\n' in arg for arg in command):
+            return None
+
+        request_id = f"{os.getpid()}-{time.monotonic_ns()}"
+        line = f"{request_id} {' '.join(shlex.quote(arg) for arg in command)}\n"
+
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not self._send(line.encode()):
+                return None
+            result = self._receive(request_id)
+
+        if result is None:
+            logger.warning("Exec session exited before the command finished")
+            return 1, b''
+        return result
+
+    def _send(self, payload):
+        """Write a request line, waiting briefly for a freshly started session to open its pipe"""
+        deadline = time.monotonic() + self.START_TIMEOUT
+        while True:
+            try:
+                fd = os.open(self.request_fifo, os.O_WRONLY | os.O_NONBLOCK)
+                break
+            except OSError:
+                # ENXIO: no reader yet; ENOENT: session directory not ready.
+                if time.monotonic() >= deadline or not self.is_running():
+                    return False
+                time.sleep(0.05)
+
+        try:
+            os.set_blocking(fd, True)
+            view = memoryview(payload)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        except OSError as e:
+            logger.debug(f"Failed to send exec request: {e}")
+            return False
+        finally:
+            os.close(fd)
+        return True
+
+    def _receive(self, request_id):
+        """Read responses until the one for request_id arrives"""
+        marker = END_MARKER.encode() + b' '
+        while self.is_running():
+            fd = os.open(self.response_fifo, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                data = self._read_response(fd)
+            finally:
+                os.close(fd)
+            if data is None:
+                return None
+
+            output, sep, trailer = data.rpartition(marker)
+            if not sep:
+                continue
+            response_id, _, status = trailer.strip().partition(b' ')
+            if response_id.decode(errors='replace') != request_id:
+                # Left over from a client that went away before reading its response.
+                continue
+            try:
+                return int(status), output
+            except ValueError:
+                return None
+        return None
+
+    def _read_response(self, fd):
+        """Read one response until the session closes its end; None if the session died"""
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        chunks = []
+        while True:
+            if not poller.poll(self.POLL_INTERVAL_MS):
+                if not self.is_running():
+                    return None
+                continue
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
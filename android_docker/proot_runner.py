@@ -8,21 +8,82 @@ Supports Docker-like command-line arguments and environment variables, includes
 import os
 import sys
 import subprocess
-import argparse
 import json
-import tempfile
 import shutil
+import tempfile
+import stat
+import errno
 import logging
 import hashlib
+import re
 import shlex
 import time
-import ipaddress
+import atexit
+import contextlib
+import functools
 from pathlib import Path
 
+from . import create_rootfs_tar
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Characters that must be backslash-escaped inside a double-quoted shell string.
+_SHELL_ESCAPE_TABLE = str.maketrans({'"': '\\"', '$': '\\$', '`': '\\`'})
+
+# A Termux libexec PATH entry together with the ':' that precedes it.
+_TERMUX_LIBEXEC_RE = re.compile(r':/data/data/com\.termux/files/usr/libexec[^:]*')
+
+
+@functools.lru_cache(maxsize=8)
+def _strip_termux_libexec(path_value):
+    """Drop Termux libexec entries from a PATH value, leaving every other entry as is"""
+    # Prefixing ':' gives each entry exactly one leading separator, so removing an entry
+    # with its separator and slicing the prefix back off keeps the rest intact.
+    return _TERMUX_LIBEXEC_RE.sub('', ':' + path_value)[1:]
+
+
+@functools.lru_cache(maxsize=64)
+def _is_localhost_address(address):
+    """Return True for loopback/unspecified (or unparseable) addresses; memoized per string"""
+    # Imported here: only Android resolv.conf generation needs it
+    import ipaddress
+
+    if '%' in address:
+        address = address.split('%', 1)[0]
+
+    try:
+        addr = ipaddress.ip_address(address)
+    except ValueError:
+        return True
+
+    return addr.is_loopback or addr.is_unspecified
+
+
+# supervisord.conf section headers (lowercase)
+_UNIX_HTTP_SERVER_HEADER = '[unix_http_server]'
+_INET_HTTP_SERVER_HEADER = '[inet_http_server]'
+_SUPERVISORCTL_HEADER = '[supervisorctl]'
+
+# Proxy variables create_rootfs_tar.main() writes into os.environ.
+_PROXY_ENV_KEYS = ('https_proxy', 'http_proxy')
+
+
+@contextlib.contextmanager
+def _preserved_proxy_env():
+    """Restore the proxy environment variables on exit"""
+    saved = {key: os.environ.get(key) for key in _PROXY_ENV_KEYS}
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
 class ProotRunner:
     """Class for running containers with proot, supports one-stop service"""
 
@@ -31,14 +92,31 @@ class ProotRunner:
     ENABLE_IMAGE_PATCHES_ENV = "ANDROID_DOCKER_ENABLE_IMAGE_PATCHES"
     DISABLE_SUPERVISOR_SOCKET_PATCH_ENV = "ANDROID_DOCKER_DISABLE_SUPERVISOR_SOCKET_PATCH"
     SUPERVISORD_INET_PORT = "127.0.0.1:9001"
+    SUPERVISORD_STAMP_SUFFIX = '.android-docker-cli.stamp'
+    ANDROID_DNS_PROPERTIES = ('net.dns1', 'net.dns2', 'net.dns3', 'net.dns4')
+    DEFAULT_SHELLS = ('bash', 'sh', 'ash', 'dash')
+    STALE_SUPERVISOR_ARTIFACTS = frozenset({'supervisor.sock', 'supervisord.pid', 'supervisord.sock'})
 
     _cached_proot_help_text = None
     _cached_proot_supports_link2symlink = None
+    # config_path -> ((st_mtime_ns, st_size), parsed image config)
+    _image_config_cache = {}
+    # config_path -> "mtime_ns:size" of a supervisord.conf that needs no (further) patching
+    _supervisord_patch_cache = {}
+    # config paths whose .android-docker-cli.bak is known to exist
+    _supervisord_backups_written = set()
+    # info_path -> ((st_mtime_ns, st_size), parsed cache info)
+    _cache_info_cache = {}
 
     def __init__(self, cache_dir=None):
         self.temp_dir = None
+        # Per-instance scratch directory holding temporary rootfs extractions, created on first use.
+        self._scratch_root = None
+        self._scratch_runs = 0
         self.rootfs_dir = None
         self.config_data = None
+        # (rootfs_dir, names under <rootfs>/bin) so shell lookups share one directory read.
+        self._rootfs_bin_entries = None
         # Best-effort env overrides passed to host exec when shell-based startup script is unavailable.
         self._container_env_overrides = {}
         self.cache_dir = cache_dir or self._get_default_cache_dir()
@@ -88,17 +166,33 @@ class ProotRunner:
 
         info_path = self._get_cache_info_path(image_url)
         with open(info_path, 'w') as f:
-            json.dump(info, f, indent=2)
+            json.dump(info, f, separators=(',', ':'))
+
+        st = os.stat(info_path)
+        self._cache_info_cache[info_path] = ((st.st_mtime_ns, st.st_size), info)
+
+    def _read_cache_info(self, info_path):
+        """Read a cache info file, reusing the parsed copy while the file is unchanged"""
+        st = os.stat(info_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._cache_info_cache.get(info_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+        self._cache_info_cache[info_path] = (stamp, info)
+        return info
 
     def _load_cache_info(self, image_url):
         """Load cache info"""
         info_path = self._get_cache_info_path(image_url)
-        if os.path.exists(info_path):
-            try:
-                with open(info_path, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"Failed to read cache info: {e}")
+        try:
+            return self._read_cache_info(info_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to read cache info: {e}")
         return None
 
     def _download_image(self, image_url, force_download=False, username=None, password=None):
@@ -115,49 +209,51 @@ class ProotRunner:
 
         logger.info(f"Downloading image: {image_url}")
 
-        # Calling create_rootfs_tar.py script
-        cmd = [
-            sys.executable,
-            '-m', 'android_docker.create_rootfs_tar',
-            '-o', cache_path,
-        ]
+        args = ['-o', cache_path]
         if username:
-            cmd.extend(['--username', username])
+            args.extend(['--username', username])
         if password:
-            cmd.extend(['--password', password])
+            args.extend(['--password', password])
         
         # Get and pass proxy parameters
         proxy = os.environ.get('https_proxy') or os.environ.get('HTTPS_PROXY')
         if proxy:
-            cmd.extend(['--proxy', proxy])
+            args.extend(['--proxy', proxy])
 
-        cmd.append(image_url)
+        args.append(image_url)
 
-        try:
-            subprocess.run(cmd, check=True)
-            logger.info(f"Image downloaded and cached: {cache_path}")
+        if not self._run_create_rootfs_tar(args):
+            return None
 
-            # Save cache info
-            self._save_cache_info(image_url, cache_path)
+        logger.info(f"Image downloaded and cached: {cache_path}")
 
-            return cache_path
+        # Save cache info
+        self._save_cache_info(image_url, cache_path)
 
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Image download failed: {e}")
-            return None
+        return cache_path
+
+    def _run_create_rootfs_tar(self, args):
+        """Run create_rootfs_tar in this interpreter"""
+        with _preserved_proxy_env():
+            try:
+                create_rootfs_tar.main(args)
+            except SystemExit as e:
+                if e.code in (None, 0):
+                    return True
+                logger.error(f"Image download failed: exit status {e.code}")
+                return False
+            except Exception as e:
+                logger.error(f"Image download failed: {e}")
+                return False
+        return True
 
     def _is_image_url(self, input_str):
         """Determine if input is an image URL"""
-        # Simple heuristic check
-        url_indicators = [
-            '/' in input_str and ':' in input_str,  # Contains registry and tag
-            input_str.count('/') >= 1,  # At least one slash
-            not input_str.endswith('.tar'),  # Not a tar file
-            not input_str.endswith('.tar.gz'),  # Not a tar.gz file
-            not os.path.exists(input_str)  # Not a local file/directory
-        ]
-
-        return any(url_indicators)
+        # Only tar archives and explicit paths are local; a bare reference such as "nginx" is an
+        # image even when a same-named file or directory exists in the current directory.
+        if input_str.endswith(('.tar', '.tar.gz')):
+            return False
+        return not (input_str.startswith(('/', './', '../')) or input_str in ('.', '..'))
 
     def _prepare_rootfs(self, input_path, args, provided_rootfs_dir=None):
         """Prepare rootfs (download or use existing)"""
@@ -200,8 +296,7 @@ class ProotRunner:
             return False
 
         # Check create_rootfs_tar.py script
-        # Since we are using `python -m`, we don't need to check for the script path here.
-        # The python interpreter will find the module.
+        # It is imported by this module and run in-process, so there is no script path to check.
         logger.info("✓ create_rootfs_tar.py module is available")
 
         # Check curl (required by create_rootfs_tar.py)
@@ -245,7 +340,9 @@ class ProotRunner:
             target_dir = provided_rootfs_dir
             self.temp_dir = None
         else:
-            self.temp_dir = tempfile.mkdtemp(prefix='proot_runner_')
+            self._scratch_runs += 1
+            self.temp_dir = os.path.join(self._ensure_scratch_root(), f'run-{self._scratch_runs}')
+            os.mkdir(self.temp_dir)
             target_dir = os.path.join(self.temp_dir, 'rootfs')
             is_temp = True
         
@@ -269,6 +366,20 @@ class ProotRunner:
                 self._cleanup()
             return None
     
+    def _ensure_scratch_root(self):
+        """Create this runner's scratch directory (once)"""
+        # A fresh mkdtemp outside the cache dir: clear_cache() must not reach running containers,
+        # and a reused pid must never map onto another process's directory.
+        if self._scratch_root is None:
+            self._scratch_root = tempfile.mkdtemp(prefix='proot_runner_')
+            atexit.register(self._remove_scratch_root)
+        return self._scratch_root
+
+    def _remove_scratch_root(self):
+        """Remove the scratch directory at interpreter exit"""
+        if self._scratch_root:
+            shutil.rmtree(self._scratch_root, ignore_errors=True)
+
     def _find_image_config(self):
         """Find image config information"""
         # Try to find config from multiple possible locations
@@ -279,14 +390,27 @@ class ProotRunner:
         ]
         
         for config_path in config_paths:
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, 'r') as f:
-                        self.config_data = json.load(f)
-                    logger.info(f"Found image config: {config_path}")
-                    return True
-                except Exception as e:
-                    logger.warning(f"Failed to read config file {config_path}: {e}")
+            try:
+                st = os.stat(config_path)
+            except OSError:
+                continue
+
+            # Reuse the parsed config while the file is unchanged (same mtime and size).
+            stamp = (st.st_mtime_ns, st.st_size)
+            cached = ProotRunner._image_config_cache.get(config_path)
+            if cached is not None and cached[0] == stamp:
+                self.config_data = cached[1]
+                logger.info(f"Found image config: {config_path}")
+                return True
+
+            try:
+                with open(config_path, 'r') as f:
+                    self.config_data = json.load(f)
+                ProotRunner._image_config_cache[config_path] = (stamp, self.config_data)
+                logger.info(f"Found image config: {config_path}")
+                return True
+            except Exception as e:
+                logger.warning(f"Failed to read config file {config_path}: {e}")
         
         logger.info("Image config file not found, will use default settings")
         return False
@@ -317,39 +441,50 @@ class ProotRunner:
 
         # Default command - find available shell
         logger.warning("Entrypoint or Cmd not found in image config, using default shell")
-        default_shells = ['/bin/bash', '/bin/sh', '/bin/ash', '/bin/dash']
-        for shell in default_shells:
-            shell_path = os.path.join(self.rootfs_dir, shell.lstrip('/'))
-            if os.path.exists(shell_path):
-                logger.debug(f"Found available shell: {shell}")
-                return [shell]
-
-        # If no shell found, try busybox
-        busybox_path = os.path.join(self.rootfs_dir, 'bin/busybox')
-        if os.path.exists(busybox_path):
+        shell = self._find_shell()
+        if shell == '/bin/busybox':
             logger.debug("Using busybox shell")
             return ['/bin/busybox', 'sh']
+        if shell:
+            logger.debug(f"Found available shell: {shell}")
+            return [shell]
 
         logger.warning("No available shell found, using default /bin/sh")
         return ['/bin/sh']  # Last fallback
 
     def _get_available_shell(self):
         """Get available shell path (for script execution)"""
-        # Find available shell
-        default_shells = ['/bin/bash', '/bin/sh', '/bin/ash', '/bin/dash']
-        for shell in default_shells:
-            shell_path = os.path.join(self.rootfs_dir, shell.lstrip('/'))
-            if os.path.exists(shell_path):
-                logger.debug(f"Found available shell for script execution: {shell}")
-                return shell
+        shell = self._find_shell()
+        if shell:
+            logger.debug(f"Found available shell for script execution: {shell}")
+            return shell
+
+        logger.warning("No available shell found for script execution")
+        return None
+
+    def _get_rootfs_bin_entries(self):
+        """Return the entry names of <rootfs>/bin, read once per rootfs."""
+        cached = self._rootfs_bin_entries
+        if cached is not None and cached[0] == self.rootfs_dir:
+            return cached[1]
+
+        try:
+            entries = frozenset(os.listdir(os.path.join(self.rootfs_dir, 'bin')))
+        except OSError:
+            entries = frozenset()
+        self._rootfs_bin_entries = (self.rootfs_dir, entries)
+        return entries
+
+    def _find_shell(self):
+        """Return the first available shell in the rootfs, falling back to busybox, or None."""
+        entries = self._get_rootfs_bin_entries()
+        for name in self.DEFAULT_SHELLS:
+            if name in entries:
+                return f'/bin/{name}'
 
         # If no shell found, try busybox
-        busybox_path = os.path.join(self.rootfs_dir, 'bin/busybox')
-        if os.path.exists(busybox_path):
-            logger.debug("Using busybox shellfor script execution")
+        if 'busybox' in entries:
             return '/bin/busybox'
-
-        logger.warning("No available shell found for script execution")
         return None
 
     def _get_default_env(self):
@@ -425,13 +560,10 @@ class ProotRunner:
                 logger.info("Android writable directory support enabled")
 
         for bind in default_binds:
-            if ':' in bind:
-                src, dst = bind.rsplit(':', 1)
-                if os.path.exists(src):
-                    cmd.extend(['-b', bind])
-            else:
-                if os.path.exists(bind):
-                    cmd.extend(['-b', bind])
+            src = bind.rsplit(':', 1)[0] if ':' in bind else bind
+            # os.path.exists follows symlinks, so a dangling source such as /sdcard is skipped.
+            if os.path.exists(src):
+                cmd.extend(['-b', bind])
 
         # User-specifiedBind mounts
         for bind in args.bind:
@@ -613,7 +745,7 @@ class ProotRunner:
         # AddEnvironment variablessettings
         for key, value in env_vars.items():
             # Escape special characters
-            escaped_value = value.replace('"', '\\"').replace('$', '\\$').replace('`', '\\`')
+            escaped_value = value.translate(_SHELL_ESCAPE_TABLE)
             script_content.append(f'export {key}="{escaped_value}"')
 
         # Add special handling in Android environment
@@ -629,16 +761,27 @@ class ProotRunner:
             quoted_command_str = shlex.quote(command[2])
             script_content.append(f'exec {command[0]} {command[1]} {quoted_command_str}')
         else:
-            command_str = ' '.join(f'"{arg}"' if ' ' in arg else arg for arg in command)
-            script_content.append(f'exec {command_str}')
+            # Pass argv positionally so the shell never re-splits or expands it
+            script_content.append(f"set -- {' '.join(map(shlex.quote, command))}")
+            script_content.append('exec "$@"')
 
-        # Write to temporary script file
+        # Write the script executable from the start; umask is cleared so 0o755 sticks
         script_path = os.path.join(self.rootfs_dir, 'startup.sh')
-        with open(script_path, 'w') as f:
-            f.write('\n'.join(script_content) + '\n')
-
-        # Set execute permissions
-        os.chmod(script_path, 0o755)
+        script_bytes = ('\n'.join(script_content) + '\n').encode()
+        old_umask = os.umask(0)
+        try:
+            fd = os.open(script_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+        finally:
+            os.umask(old_umask)
+        try:
+            view = memoryview(script_bytes)
+            while view:
+                view = view[os.write(fd, view):]
+            # The mode only applies on creation; fix up a pre-existing script
+            if stat.S_IMODE(os.fstat(fd).st_mode) != 0o755:
+                os.fchmod(fd, 0o755)
+        finally:
+            os.close(fd)
 
         logger.debug(f"Creating startup script: {script_path}")
         logger.debug(f"Script content:\n{chr(10).join(script_content)}")
@@ -646,21 +789,8 @@ class ProotRunner:
     
     def _is_android_environment(self):
         """Detect if running in Android environment (enhanced version)"""
-        android_indicators = [
-            '/data/data/com.termux' in os.getcwd(),
-            os.path.exists('/system/build.prop'),
-            os.environ.get('ANDROID_DATA') is not None,
-            os.environ.get('TERMUX_VERSION') is not None,
-            os.path.exists('/data/data/com.termux'),
-            'com.termux' in os.environ.get('PREFIX', ''),
-        ]
-        
-        is_android = any(android_indicators)
-        
-        if is_android:
-            logger.debug("Detected Android/Termux environment")
-        
-        return is_android
+        # Shared with the image downloader so there is one cached probe (and one patch point).
+        return create_rootfs_tar._detect_android()
 
     def _seed_writable_directory_structure(self, rootfs_dir, dir_path, host_dir):
         """Mirror rootfs directory structure into the host writable directory."""
@@ -708,28 +838,40 @@ class ProotRunner:
         # so software (e.g. supervisord) doesn't see inconsistent runtime state.
         shared_run_host_dir = os.path.join(writable_storage, 'run')
 
-        for dir_path in writable_dirs:
-            # Create writable directory on host side
-            if dir_path in ('run', 'var/run'):
-                host_dir = shared_run_host_dir
-            else:
-                host_dir = os.path.join(writable_storage, dir_path.replace('/', '_'))
-            os.makedirs(host_dir, exist_ok=True)
+        host_dirs = [
+            shared_run_host_dir if dir_path in ('run', 'var/run')
+            else os.path.join(writable_storage, dir_path.replace('/', '_'))
+            for dir_path in writable_dirs
+        ]
 
-            # Set permissions
-            try:
-                os.chmod(host_dir, 0o777)  # Fully writable
-            except OSError:
-                pass
+        # Create fully writable host-side directories; with umask cleared, mkdir applies 0o777
+        # directly and only pre-existing directories with a different mode need a chmod.
+        old_umask = os.umask(0)
+        try:
+            for host_dir in host_dirs:
+                try:
+                    os.mkdir(host_dir, 0o777)
+                except FileExistsError:
+                    try:
+                        if stat.S_IMODE(os.stat(host_dir).st_mode) != 0o777:
+                            os.chmod(host_dir, 0o777)
+                    except OSError:
+                        pass
+        finally:
+            os.umask(old_umask)
 
+        for dir_path, host_dir in zip(writable_dirs, host_dirs):
             # Best-effort cleanup for known stale supervisor artifacts. These are transient and can
             # block startup if persisted across runs in host-side writable dirs.
             if host_dir == shared_run_host_dir:
-                for stale_name in ('supervisor.sock', 'supervisord.pid', 'supervisord.sock'):
-                    stale_path = os.path.join(host_dir, stale_name)
+                try:
+                    with os.scandir(host_dir) as it:
+                        stale_paths = [entry.path for entry in it if entry.name in self.STALE_SUPERVISOR_ARTIFACTS]
+                except OSError:
+                    stale_paths = []
+                for stale_path in stale_paths:
                     try:
-                        if os.path.exists(stale_path):
-                            os.remove(stale_path)
+                        os.remove(stale_path)
                     except OSError:
                         pass
 
@@ -769,93 +911,126 @@ class ProotRunner:
             except OSError as exc:
                 logger.debug(f"Failed to read hosts file {source_path}: {exc}")
 
-        def has_localhost(ip_address):
-            for line in lines:
-                stripped = line.strip()
-                if not stripped or stripped.startswith('#'):
-                    continue
-                parts = stripped.split()
-                if ip_address in parts and 'localhost' in parts:
-                    return True
-            return False
+        # Parse once into IP -> host names
+        ip_to_names = {}
+        for line in lines:
+            stripped = line.strip()
+            if not stripped or stripped[0] == '#':
+                continue
+            parts = stripped.split()
+            if len(parts) >= 2:
+                ip_to_names.setdefault(parts[0], set()).update(parts[1:])
 
-        if not has_localhost('127.0.0.1'):
-            lines.append('127.0.0.1 localhost')
-        if not has_localhost('::1'):
-            lines.append('::1 localhost')
+        missing = [ip for ip in ('127.0.0.1', '::1') if 'localhost' not in ip_to_names.get(ip, ())]
+        if not missing and source_path == host_hosts_path:
+            # Our previously generated file is already complete
+            return f"{host_hosts_path}:/etc/hosts"
+        lines.extend(f'{ip} localhost' for ip in missing)
 
         try:
-            with open(host_hosts_path, 'w', encoding='utf-8') as handle:
-                handle.write('\n'.join(lines) + '\n')
-            try:
-                os.chmod(host_hosts_path, 0o644)
-            except OSError:
-                pass
+            self._write_lines_if_changed(host_hosts_path, lines)
         except OSError as exc:
             logger.debug(f"Failed to write hosts file {host_hosts_path}: {exc}")
             return None
 
         return f"{host_hosts_path}:/etc/hosts"
 
+    @staticmethod
+    def _write_lines_if_changed(path, lines):
+        """Atomically write lines to path (mode 0644) unless it already holds exactly that content"""
+        payload = ''.join(f'{line}\n' for line in lines).encode('utf-8')
+        try:
+            with open(path, 'rb') as handle:
+                if handle.read() == payload:
+                    return
+        except OSError:
+            pass
+
+        # Write a temp file created as 0644 (umask cleared) and rename it over the target,
+        # so the bound file is never seen half-written or with the wrong mode.
+        tmp_path = path + '.tmp'
+        old_umask = os.umask(0)
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        finally:
+            os.umask(old_umask)
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
     @staticmethod
     def _is_localhost_dns_server(server):
         """Return True when a DNS server points to loopback/unspecified addresses."""
         if not server:
             return True
 
-        normalized = str(server).strip()
-        if '%' in normalized:
-            normalized = normalized.split('%', 1)[0]
-
-        try:
-            addr = ipaddress.ip_address(normalized)
-        except ValueError:
-            return True
-
-        return addr.is_loopback or addr.is_unspecified
+        return _is_localhost_address(str(server).strip())
 
     @staticmethod
     def _read_nameservers_from_resolv(path):
         """Read nameserver entries from a resolv.conf style file."""
         nameservers = []
-        if not path or not os.path.exists(path):
+        if not path:
             return nameservers
 
         try:
             with open(path, 'r', encoding='utf-8', errors='ignore') as handle:
-                for line in handle:
-                    stripped = line.strip()
-                    if not stripped or stripped.startswith('#'):
-                        continue
-                    parts = stripped.split()
-                    if len(parts) >= 2 and parts[0].lower() == 'nameserver':
-                        nameservers.append(parts[1])
+                lines = handle.read().splitlines()
+        except FileNotFoundError:
+            return nameservers
         except OSError as exc:
             logger.debug(f"Failed to read resolv file {path}: {exc}")
+            return nameservers
+
+        for line in lines:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            parts = stripped.split()
+            if len(parts) >= 2 and parts[0].lower() == 'nameserver':
+                nameservers.append(parts[1])
 
         return nameservers
 
     def _get_android_dns_properties(self):
         """Best-effort DNS server discovery from Android system properties."""
-        keys = ('net.dns1', 'net.dns2', 'net.dns3', 'net.dns4')
-        values = []
+        # One getprop call listing every property instead of one process per key.
+        try:
+            result = subprocess.run(
+                ['getprop'],
+                capture_output=True,
+                text=True,
+                timeout=2,
+            )
+        except Exception:
+            return []
 
-        for key in keys:
-            try:
-                result = subprocess.run(
-                    ['getprop', key],
-                    capture_output=True,
-                    text=True,
-                    timeout=2,
-                )
-            except Exception:
-                continue
+        return self._parse_getprop_output(result.stdout or '', self.ANDROID_DNS_PROPERTIES)
 
-            value = (result.stdout or '').strip()
-            if value:
-                values.append(value)
+    @staticmethod
+    def _parse_getprop_output(output, keys):
+        """Pick non-empty values for keys, in key order, from `getprop` listing lines like "[key]: [value]"."""
+        wanted = set(keys)
+        found = {}
+        for line in output.splitlines():
+            if not line.startswith('['):
+                continue
+            key, sep, value = line[1:].partition(']: [')
+            if sep and key in wanted:
+                value = value.rstrip()
+                if value.endswith(']'):
+                    value = value[:-1].strip()
+                if value:
+                    found[key] = value
 
-        return values
+        return [found[key] for key in keys if key in found]
 
     def _prepare_android_resolv_bind(self, rootfs_dir):
         """Create Android /etc/resolv.conf bind.
@@ -872,16 +1047,16 @@ class ProotRunner:
 
         host_resolv_path = os.path.join(writable_storage, 'etc_resolv.conf')
         dns_servers = []
+        seen = set()
 
         def add_servers(candidates):
             for candidate in candidates:
                 value = str(candidate).strip()
-                if not value:
+                if not value or value in seen:
                     continue
                 if self._is_localhost_dns_server(value):
                     continue
-                if value in dns_servers:
-                    continue
+                seen.add(value)
                 dns_servers.append(value)
 
         env_dns = os.environ.get('ANDROID_DOCKER_DNS', '')
@@ -894,47 +1069,49 @@ class ProotRunner:
         lines = [f'nameserver {server}' for server in dns_servers]
 
         try:
-            with open(host_resolv_path, 'w', encoding='utf-8') as handle:
-                handle.write('\n'.join(lines) + '\n')
-            try:
-                os.chmod(host_resolv_path, 0o644)
-            except OSError:
-                pass
+            self._write_lines_if_changed(host_resolv_path, lines)
         except OSError as exc:
             logger.debug(f"Failed to write resolv file {host_resolv_path}: {exc}")
             return None
 
         return f"{host_resolv_path}:/etc/resolv.conf"
 
-    def _prepare_environment(self):
-        """Prepare runtime environment, handle Android Termux special issues"""
-        env = os.environ.copy()
+    def _prepare_environment(self, allow_inherit=False):
+        """Prepare runtime environment, handle Android Termux special issues
+
+        With allow_inherit=True, returns None when os.environ needs no changes so callers can let
+        the child inherit it instead of copying the whole environment.
+        """
+        overrides = {}
+        unset_keys = []
 
         # In Android Termux, need to unset LD_PRELOAD to avoid termux-exec interference
         if self._is_android_environment():
             logger.info("Detected Android environment, adjusting environment variables...")
 
             # Unset LD_PRELOAD
-            if 'LD_PRELOAD' in env:
+            if 'LD_PRELOAD' in os.environ:
                 logger.debug("Unset LD_PRELOAD to avoid termux-exec interference")
-                del env['LD_PRELOAD']
+                unset_keys.append('LD_PRELOAD')
 
             # Set safer PATH
-            termux_path = env.get('PATH', '')
+            termux_path = os.environ.get('PATH', '')
             # Remove termux-specific paths that may cause problems
-            path_parts = termux_path.split(':')
-            safe_paths = []
-            for path in path_parts:
-                if not path.startswith('/data/data/com.termux/files/usr/libexec'):
-                    safe_paths.append(path)
-
-            env['PATH'] = ':'.join(safe_paths)
-            logger.debug(f"Adjusted PATH: {env['PATH']}")
+            safe_path = _strip_termux_libexec(termux_path)
+            if safe_path != termux_path:
+                overrides['PATH'] = safe_path
+            logger.debug(f"Adjusted PATH: {safe_path}")
 
         # Inject container env overrides when script-based env export is unavailable.
-        for key, value in (self._container_env_overrides or {}).items():
-            env[key] = value
+        overrides.update(self._container_env_overrides or {})
 
+        if allow_inherit and not overrides and not unset_keys:
+            return None
+
+        env = os.environ.copy()
+        for key in unset_keys:
+            env.pop(key, None)
+        env.update(overrides)
         return env
 
     def _maybe_patch_supervisord_socket(self, rootfs_dir):
@@ -966,86 +1143,139 @@ class ProotRunner:
         ]
 
         for config_path in candidate_paths:
-            if not os.path.exists(config_path):
-                continue
-
             try:
-                with open(config_path, 'r', encoding='utf-8', errors='ignore') as handle:
-                    original_lines = handle.read().splitlines()
+                st = os.stat(config_path)
             except OSError:
                 continue
 
-            # Fast check: only patch configs that define a unix socket control interface.
-            if not any(line.strip() == '[unix_http_server]' for line in original_lines):
-                continue
-            if not any('supervisor.sock' in line for line in original_lines):
-                continue
-            # If inet server already exists, or supervisorctl already uses http, don't touch it.
-            if any(line.strip() == '[inet_http_server]' for line in original_lines):
-                continue
-            if any(line.strip().startswith('serverurl=http') for line in original_lines):
+            if self._supervisord_config_settled(config_path, f"{st.st_mtime_ns}:{st.st_size}"):
                 continue
 
-            port = self.SUPERVISORD_INET_PORT
-            changed = False
-            patched = []
-            in_unix = False
-            in_supervisorctl = False
-            inserted_inet = False
+            if self._patch_supervisord_config(config_path):
+                self._remember_supervisord_config(config_path)
 
-            def maybe_insert_inet():
-                nonlocal inserted_inet, changed
-                if inserted_inet:
-                    return
-                patched.append('[inet_http_server]')
-                patched.append(f'port={port}')
-                patched.append('')
-                inserted_inet = True
-                changed = True
+    def _supervisord_config_settled(self, config_path, stamp):
+        """Check whether config_path was already handled at this mtime/size stamp"""
+        if self._supervisord_patch_cache.get(config_path) == stamp:
+            return True
 
-            for line in original_lines:
-                stripped = line.strip()
+        # Stamp left by an earlier run of the CLI
+        try:
+            with open(config_path + self.SUPERVISORD_STAMP_SUFFIX, 'r') as handle:
+                if handle.read().strip() != stamp:
+                    return False
+        except OSError:
+            return False
 
-                if stripped.startswith('[') and stripped.endswith(']') and len(stripped) > 2:
-                    in_supervisorctl = (stripped.lower() == '[supervisorctl]')
-                    if stripped.lower() == '[unix_http_server]':
-                        in_unix = True
-                        changed = True
-                        continue
-                    if in_unix:
-                        in_unix = False
+        self._supervisord_patch_cache[config_path] = stamp
+        return True
 
-                    if stripped.lower() == '[supervisorctl]':
-                        maybe_insert_inet()
+    def _remember_supervisord_config(self, config_path):
+        """Record the current stamp of a config that needs no further patching"""
+        try:
+            st = os.stat(config_path)
+        except OSError:
+            return
+        stamp = f"{st.st_mtime_ns}:{st.st_size}"
+        self._supervisord_patch_cache[config_path] = stamp
+        try:
+            with open(config_path + self.SUPERVISORD_STAMP_SUFFIX, 'w') as handle:
+                handle.write(stamp)
+        except OSError:
+            pass
 
-                if in_unix:
-                    continue
+    def _patch_supervisord_config(self, config_path):
+        """Patch one supervisord.conf; returns False if it could not be read or written"""
+        try:
+            with open(config_path, 'r', encoding='utf-8', errors='ignore') as handle:
+                original_lines = handle.read().splitlines()
+        except OSError:
+            return False
 
-                if in_supervisorctl and stripped.startswith('serverurl=unix://'):
-                    patched.append(f'serverurl=http://{port}')
+        # Classify every line in one pass, keeping the stripped form for the rewrite below.
+        has_unix = has_sock = has_inet = has_http_url = False
+        stripped_lines = []
+        for line in original_lines:
+            stripped = line.strip()
+            stripped_lines.append(stripped)
+            if stripped == _UNIX_HTTP_SERVER_HEADER:
+                has_unix = True
+            elif stripped == _INET_HTTP_SERVER_HEADER:
+                has_inet = True
+            if 'supervisor.sock' in line:
+                has_sock = True
+            if stripped.startswith('serverurl=http'):
+                has_http_url = True
+
+        # Only patch configs that define a unix socket control interface. If inet server
+        # already exists, or supervisorctl already uses http, don't touch it.
+        if not has_unix or not has_sock or has_inet or has_http_url:
+            return True
+
+        port = self.SUPERVISORD_INET_PORT
+        changed = False
+        patched = []
+        in_unix = False
+        in_supervisorctl = False
+        inserted_inet = False
+
+        def maybe_insert_inet():
+            nonlocal inserted_inet, changed
+            if inserted_inet:
+                return
+            patched.append(_INET_HTTP_SERVER_HEADER)
+            patched.append(f'port={port}')
+            patched.append('')
+            inserted_inet = True
+            changed = True
+
+        for line, stripped in zip(original_lines, stripped_lines):
+            if stripped.startswith('[') and stripped.endswith(']') and len(stripped) > 2:
+                header = stripped.lower()
+                in_supervisorctl = (header == _SUPERVISORCTL_HEADER)
+                if header == _UNIX_HTTP_SERVER_HEADER:
+                    in_unix = True
                     changed = True
                     continue
+                if in_unix:
+                    in_unix = False
 
-                patched.append(line)
+                if in_supervisorctl:
+                    maybe_insert_inet()
 
-            if not changed:
+            if in_unix:
+                continue
+
+            if in_supervisorctl and stripped.startswith('serverurl=unix://'):
+                patched.append(f'serverurl=http://{port}')
+                changed = True
                 continue
 
-            # Write a one-time backup for troubleshooting.
+            patched.append(line)
+
+        if not changed:
+            return True
+
+        # Write a one-time backup for troubleshooting. Exclusive create doubles as the
+        # existence check; once a backup is known to exist it is not looked at again.
+        if config_path not in self._supervisord_backups_written:
             backup_path = config_path + '.android-docker-cli.bak'
             try:
-                if not os.path.exists(backup_path):
-                    with open(backup_path, 'w', encoding='utf-8', errors='ignore') as handle:
-                        handle.write('\n'.join(original_lines) + '\n')
+                with open(backup_path, 'x', encoding='utf-8', errors='ignore') as handle:
+                    handle.writelines(f'{line}\n' for line in original_lines)
+                self._supervisord_backups_written.add(config_path)
+            except FileExistsError:
+                self._supervisord_backups_written.add(config_path)
             except OSError:
                 pass
 
-            try:
-                with open(config_path, 'w', encoding='utf-8', errors='ignore') as handle:
-                    handle.write('\n'.join(patched) + '\n')
-                logger.info(f"Android compatibility: Changed supervisord unix socket to inet_http_server: {config_path}")
-            except OSError:
-                pass
+        try:
+            with open(config_path, 'w', encoding='utf-8', errors='ignore') as handle:
+                handle.writelines(f'{line}\n' for line in patched)
+            logger.info(f"Android compatibility: Changed supervisord unix socket to inet_http_server: {config_path}")
+        except OSError:
+            return False
+        return True
 
     def run(self, input_path, args, rootfs_dir=None, pid_file=None):
         """Run container (one-stop service)"""
@@ -1099,53 +1329,63 @@ class ProotRunner:
 
             # Run proot
             if args.detach:
-                # Manually implement backgrounding (fork/exec)
-                env = self._prepare_environment()
+                # Background: start proot in its own session (posix_spawn, or fork/exec fallback)
+                env = self._prepare_environment(allow_inherit=True)
                 pid_file_path = getattr(args, 'pid_file', None)
 
                 try:
-                    pid = os.fork()
-                    if pid > 0:
-                        # Parent process
-                        logger.info(f"Container started in background, PID: {pid}")
-                        if pid_file_path:
-                            try:
-                                with open(pid_file_path, 'w') as f:
-                                    f.write(str(pid))
-                                logger.debug(f"PID {pid} written to {pid_file_path}")
-                            except IOError as e:
-                                logger.error(f"Failed to write PID file: {e}")
-                        # Parent processSuccessfully written PID and exiting
-                        return True
-
-                    # Child process
-                    os.setsid() # Create new session, detach from controlling terminal
-                    
-                    # Redirect standard file descriptors
-                    sys.stdout.flush()
-                    sys.stderr.flush()
-                    
-                    stdout_dest = log_file_handle or open(os.devnull, 'wb')
-                    stderr_dest = log_file_handle or open(os.devnull, 'wb')
-                    
-                    os.dup2(stdout_dest.fileno(), sys.stdout.fileno())
-                    os.dup2(stderr_dest.fileno(), sys.stderr.fileno())
-                    
-                    # stdin redirected to /dev/null
-                    with open(os.devnull, 'rb') as devnull:
-                        os.dup2(devnull.fileno(), sys.stdin.fileno())
-
-                    # Execute proot command
-                    os.execvpe(proot_cmd[0], proot_cmd, env)
-
-                except Exception as e:
-                    logger.error(f"Background startup failed (fork/exec): {e}")
-                    # Child process needs to manually exit if exec fails
-                    sys.exit(1)
+                    pid = self._spawn_detached(proot_cmd, env if env is not None else os.environ, log_file_handle)
+                except OSError as e:
+                    logger.error(f"Background startup failed (posix_spawn): {e}")
+                    return False
+
+                if pid is None:
+                    # posix_spawn cannot start a new session on this platform; fork/exec instead
+                    try:
+                        pid = os.fork()
+                        if pid == 0:
+                            # Child process
+                            os.setsid() # Create new session, detach from controlling terminal
+
+                            # Redirect standard file descriptors
+                            sys.stdout.flush()
+                            sys.stderr.flush()
+
+                            # One /dev/null descriptor serves stdin and, without a log file, stdout/stderr
+                            devnull_fd = os.open(os.devnull, os.O_RDWR)
+                            out_fd = log_file_handle.fileno() if log_file_handle else devnull_fd
+
+                            os.dup2(out_fd, sys.stdout.fileno())
+                            os.dup2(out_fd, sys.stderr.fileno())
+                            os.dup2(devnull_fd, sys.stdin.fileno())
+                            os.close(devnull_fd)
+
+                            # Execute proot command
+                            os.execvpe(proot_cmd[0], proot_cmd, env if env is not None else os.environ)
+
+                    except Exception as e:
+                        logger.error(f"Background startup failed (fork/exec): {e}")
+                        # Child process needs to manually exit if exec fails
+                        sys.exit(1)
+
+                # The detached container keeps using its scratch rootfs after we exit. Only hand it
+                # over once the container is running; on failure the atexit hook still removes it.
+                if self.temp_dir:
+                    atexit.unregister(self._remove_scratch_root)
+
+                logger.info(f"Container started in background, PID: {pid}")
+                if pid_file_path:
+                    try:
+                        with open(pid_file_path, 'w') as f:
+                            f.write(str(pid))
+                        logger.debug(f"PID {pid} written to {pid_file_path}")
+                    except IOError as e:
+                        logger.error(f"Failed to write PID file: {e}")
+                return True
             else:
                 # Run in foreground (interactive or non-interactive)
                 logger.info("Entering container environment...")
-                env = self._prepare_environment()
+                env = self._prepare_environment(allow_inherit=True)
                 
                 # Set stdin/stdout/stderr based on whether it's interactive mode
                 if getattr(args, 'interactive', False):
@@ -1171,6 +1411,36 @@ class ProotRunner:
             if hasattr(args, 'detach') and not args.detach:
                 self._cleanup()
     
+    @staticmethod
+    def _spawn_detached(cmd, env, log_file_handle=None):
+        """Start cmd in a new session, stdin on /dev/null and output to the log file (or /dev/null).
+
+        Returns the pid, or None when posix_spawn cannot create a session on this platform.
+        Raises OSError when the executable cannot be found or started.
+        """
+        if not hasattr(os, 'posix_spawn'):
+            return None
+
+        # posix_spawnp would search the parent's PATH; resolve against the PATH the child gets.
+        executable = shutil.which(cmd[0], path=env.get('PATH', os.defpath))
+        if executable is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), cmd[0])
+
+        devnull = os.open(os.devnull, os.O_RDWR)
+        try:
+            out_fd = log_file_handle.fileno() if log_file_handle else devnull
+            file_actions = [
+                (os.POSIX_SPAWN_DUP2, devnull, 0),
+                (os.POSIX_SPAWN_DUP2, out_fd, 1),
+                (os.POSIX_SPAWN_DUP2, out_fd, 2),
+            ]
+            try:
+                return os.posix_spawn(executable, cmd, env, file_actions=file_actions, setsid=True)
+            except NotImplementedError:
+                return None
+        finally:
+            os.close(devnull)
+
     def _cleanup(self):
         """Cleanup temporary files"""
         if self.temp_dir and os.path.exists(self.temp_dir):
@@ -1179,39 +1449,40 @@ class ProotRunner:
 
     def list_cache(self):
         """List cached images"""
-        if not os.path.exists(self.cache_dir):
+        cache_files = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                entries = [entry for entry in it if entry.name.endswith('.tar.gz')]
+        except FileNotFoundError:
             logger.info("Cache directory does not exist")
             return
 
-        cache_files = []
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.tar.gz'):
-                cache_path = os.path.join(self.cache_dir, filename)
-                info_path = cache_path + '.info'
+        for entry in entries:
+            info_path = entry.path + '.info'
 
-                # Get file information
-                stat = os.stat(cache_path)
-                size_mb = stat.st_size / 1024 / 1024
+            # Get file information
+            try:
+                size_mb = entry.stat().st_size / 1024 / 1024
+            except OSError:
+                continue
 
-                # Try to read cache info
-                image_url = "Unknown"
-                created_time = "Unknown"
+            # Try to read cache info
+            image_url = "Unknown"
+            created_time = "Unknown"
 
-                if os.path.exists(info_path):
-                    try:
-                        with open(info_path, 'r') as f:
-                            info = json.load(f)
-                        image_url = info.get('image_url', 'Unknown')
-                        created_time = info.get('created_time_str', 'Unknown')
-                    except Exception:
-                        pass
+            try:
+                info = self._read_cache_info(info_path)
+                image_url = info.get('image_url', 'Unknown')
+                created_time = info.get('created_time_str', 'Unknown')
+            except Exception:
+                pass
 
-                cache_files.append({
-                    'filename': filename,
-                    'image_url': image_url,
-                    'size_mb': size_mb,
-                    'created_time': created_time
-                })
+            cache_files.append({
+                'filename': entry.name,
+                'image_url': image_url,
+                'size_mb': size_mb,
+                'created_time': created_time
+            })
 
         if not cache_files:
             logger.info("No cached images")
@@ -1235,6 +1506,7 @@ class ProotRunner:
             cache_path = self._get_image_cache_path(image_url)
             info_path = self._get_cache_info_path(image_url)
 
+            self._cache_info_cache.pop(info_path, None)
             removed = False
             for path in [cache_path, info_path]:
                 if os.path.exists(path):
@@ -1246,8 +1518,10 @@ class ProotRunner:
             else:
                 logger.info(f"Image not cached: {image_url}")
         else:
-            # Clean all caches
+            # Clean all caches. Deleted synchronously: the CLI exits right after, so a background
+            # delete would either be waited for anyway or, if interrupted, leave trash behind.
             if os.path.exists(self.cache_dir):
+                self._cache_info_cache.clear()
                 shutil.rmtree(self.cache_dir)
                 self._ensure_cache_dir()
                 logger.info("Cleaned all caches")
@@ -1255,6 +1529,8 @@ class ProotRunner:
                 logger.info("Cache directory does not exist")
 
 def main():
+    import argparse
+
     parser = argparse.ArgumentParser(
         description='One-stop service for running Docker images with proot',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -11,11 +11,10 @@ import argparse
 from datetime import datetime
 
 
-def run_command(cmd, check=True):
-    """Execute command and return output"""
+def run_command(argv, check=True):
+    """Execute command (argv list, no shell) and return output"""
     result = subprocess.run(
-        cmd,
-        shell=True,
+        argv,
         capture_output=True,
         text=True,
         encoding='utf-8'
@@ -28,7 +27,8 @@ def run_command(cmd, check=True):
 
 def get_recent_commits(count=5):
     """Get recent commit history"""
-    commits = run_command(f"git log --oneline -n {count}")
+    # Explicit format: one "<hash> <subject>" line each, unaffected by log.decorate settings
+    commits = run_command(['git', 'log', '-n', str(count), '--pretty=format:%h %s'])
     return commits
 
 
@@ -84,7 +84,7 @@ def main():
     print(f"📦 Preparing to create Release: {version}")
     
     # Check for uncommitted changes
-    status = run_command("git status --porcelain", check=False)
+    status = run_command(['git', 'status', '--porcelain'], check=False)
     if status:
         print("⚠️  Warning: There are uncommitted changes")
         response = input("Continue anyway? (y/n): ")
@@ -94,11 +94,11 @@ def main():
     
     # Create tag
     print(f"🏷️  Creating tag: {version}")
-    run_command(f'git tag -a {version} -m "Release {version}"')
+    run_command(['git', 'tag', '-a', version, '-m', f'Release {version}'])
     
-    # Push tag
+    # Push only the tag ref; the full refspec can't be mistaken for a branch of the same name
     print(f"⬆️  Pushing tag to GitHub")
-    run_command(f'git push origin {version}')
+    run_command(['git', 'push', 'origin', f'refs/tags/{version}'])
     
     # Generate Release notes
     notes = create_release_notes(version, args.notes)
@@ -106,12 +106,12 @@ def main():
     # Create Release
     print(f"🚀 Creating GitHub Release")
     
-    cmd = f'gh release create {version} --title "{version}" --notes "{notes}"'
+    cmd = ['gh', 'release', 'create', version, '--title', version, '--notes', notes]
     
     if args.draft:
-        cmd += ' --draft'
+        cmd.append('--draft')
     if args.prerelease:
-        cmd += ' --prerelease'
+        cmd.append('--prerelease')
     
     release_url = run_command(cmd)
     
@@ -0,0 +1,17 @@
+"""
+Shared pytest configuration
+"""
+
+import sys
+from pathlib import Path
+
+from hypothesis import Phase, settings
+
+# Make the android_docker package importable once for every test module.
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+# Only run @example cases, with no random generation or shrinking. Opt in with
+# `pytest --hypothesis-profile=explicit` for quick local runs; the default profile is unchanged.
+settings.register_profile("explicit", phases=[Phase.explicit], database=None)
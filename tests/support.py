@@ -0,0 +1,15 @@
+"""
+Shared test helpers
+"""
+
+import tempfile
+
+
+def make_temp_dir(test_case, prefix):
+    """Create a per-test temporary directory that is removed by the test's cleanups.
+
+    Cleanups run after tearDown, so tearDown may still use the directory.
+    """
+    tmp = tempfile.TemporaryDirectory(prefix=prefix)
+    test_case.addCleanup(tmp.cleanup)
+    return tmp.name
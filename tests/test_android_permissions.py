@@ -4,22 +4,83 @@ Android权限修复的属性测试和单元测试
 使用hypothesis库进行基于属性的测试
 """
 
+import copy
+import functools
 import io
 import os
-import sys
+import re
 import tempfile
 import shutil
 import stat
+import subprocess
 import tarfile
 import unittest
-from hypothesis import given, strategies as st, settings
+import uuid
+from unittest import mock
+from hypothesis import Phase, example, given, strategies as st, settings
 from pathlib import Path
 
-# 添加父目录到路径以便导入模块
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from android_docker.create_rootfs_tar import DockerImageToRootFS
+from android_docker.create_rootfs_tar import (
+    DockerImageToRootFS, _TAR_COPY_BUFSIZE, _is_whiteout,
+)
 from android_docker.proot_runner import ProotRunner
+from tests.support import make_temp_dir
+
+# 两个模块共用的Android探测函数，测试中统一在此处打补丁
+_DETECT_ANDROID = 'android_docker.create_rootfs_tar._detect_android'
+
+# 安装脚本URL中的版本号模式
+_VERSION_RE = re.compile(r'/v\d+\.\d+\.\d+/')
+
+# 本文件的属性测试断言都很简单：不写示例数据库、不做收缩/解释，也不设截止时间。
+# 阶段列表从当前激活的profile中裁剪，因此 --hypothesis-profile=explicit 仍然生效。
+_FAST_SETTINGS = settings(
+    max_examples=20,
+    database=None,
+    deadline=None,
+    phases=[phase for phase in settings.default.phases if phase not in (Phase.shrink, Phase.explain)],
+)
+
+# whiteout路径组件只从与 ".wh." 相近的小字母表中抽取，使生成的样例集中在边界附近
+_NAME_PART = st.text(alphabet='.whx0_', min_size=1, max_size=8)
+_PATH_DIRS = st.lists(_NAME_PART.filter(lambda part: not part.startswith('.wh.')), max_size=3)
+
+# 可写系统目录候选；取排列的前缀即可得到互不重复的列表，无需 unique=True 的拒绝采样
+_SYSTEM_DIRS = ('var/log', 'var/cache', 'var/tmp', 'var/run', 'tmp', 'run')
+
+
+@functools.lru_cache(maxsize=1)
+def _image_processor_template():
+    """模块内只构造一次DockerImageToRootFS，各测试拿浅拷贝再设置自己的路径"""
+    return DockerImageToRootFS('test:latest')
+
+
+class SharedTempRootTestCase(unittest.TestCase):
+    """每个测试类共享一个临时根目录，每个测试只创建一个子目录，类结束时统一清理"""
+
+    temp_prefix = 'test_'
+
+    @classmethod
+    def setUpClass(cls):
+        # pytest-xdist 下带上worker名（非xdist运行为main，不与gw*混淆），便于区分各进程留下的目录
+        worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+        cls._root = tempfile.mkdtemp(prefix=f'{cls.temp_prefix}{worker}_')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._root, ignore_errors=True)
+
+    def make_test_dir(self):
+        path = os.path.join(self._root, uuid.uuid4().hex)
+        os.mkdir(path)
+        return path
+
+    @staticmethod
+    def make_image_processor(work_dir):
+        image_processor = copy.copy(_image_processor_template())
+        image_processor.output_path = os.path.join(work_dir, 'test.tar')
+        image_processor.temp_dir = work_dir
+        return image_processor
 
 
 class TestWhiteoutFileHandling(unittest.TestCase):
@@ -28,47 +89,76 @@ class TestWhiteoutFileHandling(unittest.TestCase):
     def test_whiteout_file_detection(self):
         """单元测试：验证whiteout文件被正确识别和跳过"""
         # 测试 .wh.auxfiles 被跳过
-        self.assertTrue('.wh.auxfiles'.startswith('.wh.'))
+        self.assertTrue(_is_whiteout('.wh.auxfiles'))
         
         # 测试 dir/.wh.file 被跳过
-        self.assertTrue('/.wh.' in 'dir/.wh.file')
+        self.assertTrue(_is_whiteout('dir/.wh.file'))
         
         # 测试正常文件不被跳过
-        self.assertFalse('normal_file.txt'.startswith('.wh.'))
-        self.assertFalse('/.wh.' in 'normal_file.txt')
+        self.assertFalse(_is_whiteout('normal_file.txt'))
     
-    @given(st.text(min_size=1, max_size=50))
-    @settings(max_examples=100)
-    def test_whiteout_prefix_detection(self, filename):
+    def test_whiteout_prefix_detection(self):
         """
         Property 1: Whiteout文件排除
         Validates: Requirements 1.1, 1.2, 1.3
         
-        对于任意文件名，如果它以.wh.开头或包含/.wh.，应该被识别为whiteout文件
+        文件名以.wh.开头或包含/.wh.时应被识别为whiteout文件（边界用例表驱动）
         """
-        is_whiteout = filename.startswith('.wh.') or '/.wh.' in filename
-        
-        if is_whiteout:
-            # whiteout文件应该被跳过
-            self.assertTrue(filename.startswith('.wh.') or '/.wh.' in filename)
+        cases = {
+            '.wh.foo': True,
+            '.wh..wh..opq': True,
+            '.wh.': True,
+            'dir/.wh.file': True,
+            'a/b/.wh.': True,
+            'normal.txt': False,
+            '': False,
+            '.whx': False,
+            '.wh': False,
+            'dir/.whfile': False,
+            'dir.wh.file': False,
+            'dir/x.wh.file': False,
+        }
+        for filename, expected in cases.items():
+            with self.subTest(filename=filename):
+                self.assertEqual(_is_whiteout(filename), expected)
+
+    @given(st.one_of(
+        st.tuples(_PATH_DIRS, _NAME_PART).map(lambda parts: ('/'.join(parts[0] + ['.wh.' + parts[1]]), True)),
+        _PATH_DIRS.filter(bool).map(lambda dirs: ('/'.join(dirs), False)),
+    ))
+    @example(('.wh._', True))
+    @example(('w/x/.wh..wh.', True))
+    @example(('.whx', False))
+    @example(('..wh._/x.wh.0', False))
+    @example(('w/.wh', False))
+    @_FAST_SETTINGS
+    def test_whiteout_generated_paths(self, case):
+        """在只含 . / w h 等字符的路径上检查边界：恰好有一个组件以.wh.开头才是whiteout"""
+        filename, expected = case
+        self.assertEqual(_is_whiteout(filename), expected)
+
+
+class TestWritableDirectories(SharedTempRootTestCase):
+    """测试可写目录功能"""
 
+    temp_prefix = 'test_writable_'
 
-class TestWritableDirectories(unittest.TestCase):
-    """测试可写目录功能"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 可写目录按rootfs路径计算，runner本身无状态，所有测试和样例共用一个
+        cls.runner = ProotRunner(cache_dir=cls._root)
     
     def setUp(self):
         """设置测试环境"""
-        self.test_dir = tempfile.mkdtemp(prefix='test_writable_')
-        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.test_dir = self.make_test_dir()
     
-    def tearDown(self):
-        """清理测试环境"""
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
-    
-    @given(st.lists(st.sampled_from(['var/log', 'var/cache', 'var/tmp', 'var/run', 'tmp', 'run']), 
-                    min_size=1, max_size=5, unique=True))
-    @settings(max_examples=50)
+    @given(st.integers(min_value=1, max_value=5).flatmap(
+        lambda n: st.permutations(_SYSTEM_DIRS).map(lambda dirs: dirs[:n])))
+    @example(['var/log'])
+    @example(['tmp', 'run'])
+    @example(list(_SYSTEM_DIRS[:5]))
+    @_FAST_SETTINGS
     def test_writable_directory_creation(self, dir_list):
         """
         Property 3: 可写目录创建
@@ -76,77 +166,87 @@ class TestWritableDirectories(unittest.TestCase):
         
         对于任意系统目录列表，创建的可写目录应该存在且具有正确的权限
         """
-        container_dir = os.path.join(self.test_dir, 'test_container')
-        os.makedirs(container_dir, exist_ok=True)
+        # 每个生成的样例使用独立的子目录
+        container_dir = os.path.join(self.make_test_dir(), 'test_container')
+        os.mkdir(container_dir)
         
         # 模拟Android环境
-        original_method = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
-        
-        try:
+        with mock.patch(_DETECT_ANDROID, return_value=True):
             bind_mounts = self.runner._prepare_writable_directories(container_dir)
             
             # 验证返回的绑定挂载列表
             self.assertIsInstance(bind_mounts, list)
             self.assertGreater(len(bind_mounts), 0)
+            mounted = {bind.rsplit(':', 1)[1] for bind in bind_mounts}
+            for dir_path in dir_list:
+                self.assertIn(f'/{dir_path}', mounted)
             
-            # 验证writable_dirs目录被创建（在父目录中）
-            parent_dir = os.path.dirname(container_dir)
-            writable_storage = os.path.join(parent_dir, 'writable_dirs')
-            self.assertTrue(os.path.exists(writable_storage), 
-                          f"writable_storage目录应该存在: {writable_storage}")
-            
-            # 验证至少有一些子目录被创建
-            subdirs = os.listdir(writable_storage)
-            self.assertGreater(len(subdirs), 0, "应该创建子目录")
-        finally:
-            self.runner._is_android_environment = original_method
+            # 验证writable_dirs目录被创建（在父目录中），且至少有一些子目录；
+            # scandir 不存在时直接抛错，DirEntry 自带类型信息，无需再 stat
+            writable_storage = os.path.join(os.path.dirname(container_dir), 'writable_dirs')
+            with os.scandir(writable_storage) as it:
+                entries = list(it)
+            self.assertTrue(entries, "应该创建子目录")
+            self.assertTrue(entries[0].is_dir())
 
     def test_writable_directory_seeding(self):
         """Writable dirs mirror nested rootfs directories."""
-        rootfs_dir = os.path.join(self.test_dir, 'rootfs')
-        os.makedirs(os.path.join(rootfs_dir, 'var', 'log', 'nginx'), exist_ok=True)
-        os.makedirs(os.path.join(rootfs_dir, 'var', 'cache', 'nginx', 'client_temp'), exist_ok=True)
-
-        original_method = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
-
-        try:
-            self.runner._prepare_writable_directories(rootfs_dir)
-            writable_storage = os.path.join(self.test_dir, 'writable_dirs')
-            self.assertTrue(os.path.isdir(os.path.join(writable_storage, 'var_log', 'nginx')))
-            self.assertTrue(os.path.isdir(os.path.join(writable_storage, 'var_cache', 'nginx', 'client_temp')))
-        finally:
-            self.runner._is_android_environment = original_method
+        rootfs_dir = Path(self.test_dir, 'rootfs')
+        for rel_path in ('var/log/nginx', 'var/cache/nginx/client_temp'):
+            (rootfs_dir / rel_path).mkdir(parents=True, exist_ok=True)
+
+        with mock.patch(_DETECT_ANDROID, return_value=True):
+            self.runner._prepare_writable_directories(str(rootfs_dir))
+
+        present = self._walk_dirs(os.path.join(self.test_dir, 'writable_dirs'))
+        self.assertLessEqual({'var_log/nginx', 'var_cache/nginx/client_temp'}, present)
+
+    @staticmethod
+    def _walk_dirs(root):
+        """一次scandir遍历收集root下所有目录的相对路径"""
+        present = set()
+        stack = [('', root)]
+        while stack:
+            prefix, path = stack.pop()
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        rel_path = prefix + entry.name
+                        present.add(rel_path)
+                        stack.append((rel_path + '/', entry.path))
+        return present
 
     def test_run_and_var_run_share_host_dir(self):
         rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(rootfs_dir, 'bin'), exist_ok=True)
         Path(os.path.join(rootfs_dir, 'bin', 'sh')).touch()
 
-        original_method = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
-
-        try:
+        with mock.patch(_DETECT_ANDROID, return_value=True):
             binds = self.runner._prepare_writable_directories(rootfs_dir)
             run_bind = next(b for b in binds if b.endswith(':/run'))
             var_run_bind = next(b for b in binds if b.endswith(':/var/run'))
             self.assertEqual(run_bind.split(':', 1)[0], var_run_bind.split(':', 1)[0])
-        finally:
-            self.runner._is_android_environment = original_method
+
+    def test_stale_supervisor_artifacts_removed(self):
+        rootfs_dir = os.path.join(self.test_dir, 'rootfs')
+        os.makedirs(rootfs_dir, exist_ok=True)
+        run_dir = os.path.join(self.test_dir, 'writable_dirs', 'run')
+        os.makedirs(run_dir, exist_ok=True)
+        for name in ('supervisor.sock', 'supervisord.pid', 'keep.pid'):
+            Path(os.path.join(run_dir, name)).touch()
+
+        with mock.patch(_DETECT_ANDROID, return_value=True):
+            self.runner._prepare_writable_directories(rootfs_dir)
+            self.assertEqual(os.listdir(run_dir), ['keep.pid'])
 
 
 class TestAndroidHostsBind(unittest.TestCase):
     """测试Android hosts绑定"""
 
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_hosts_')
+        self.test_dir = make_temp_dir(self, 'test_hosts_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
 
-    def tearDown(self):
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
-
     def test_android_hosts_file_creation(self):
         rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(rootfs_dir, 'etc'), exist_ok=True)
@@ -155,10 +255,7 @@ class TestAndroidHostsBind(unittest.TestCase):
             encoding='utf-8'
         )
 
-        original_method = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
-
-        try:
+        with mock.patch(_DETECT_ANDROID, return_value=True):
             bind_spec = self.runner._prepare_android_hosts_bind(rootfs_dir)
             self.assertIsNotNone(bind_spec)
 
@@ -170,8 +267,6 @@ class TestAndroidHostsBind(unittest.TestCase):
             self.assertIn('10.0.0.5 internal-service', content)
             self.assertIn('127.0.0.1 localhost', content)
             self.assertIn('::1 localhost', content)
-        finally:
-            self.runner._is_android_environment = original_method
 
     def test_android_hosts_file_preserves_existing(self):
         rootfs_dir = os.path.join(self.test_dir, 'rootfs')
@@ -181,10 +276,7 @@ class TestAndroidHostsBind(unittest.TestCase):
         host_hosts_path = os.path.join(writable_storage, 'etc_hosts')
         Path(host_hosts_path).write_text('192.168.0.10 existing-host\n', encoding='utf-8')
 
-        original_method = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
-
-        try:
+        with mock.patch(_DETECT_ANDROID, return_value=True):
             bind_spec = self.runner._prepare_android_hosts_bind(rootfs_dir)
             self.assertEqual(bind_spec, f"{host_hosts_path}:/etc/hosts")
 
@@ -192,29 +284,38 @@ class TestAndroidHostsBind(unittest.TestCase):
             self.assertIn('192.168.0.10 existing-host', content)
             self.assertIn('127.0.0.1 localhost', content)
             self.assertIn('::1 localhost', content)
-        finally:
-            self.runner._is_android_environment = original_method
+
+    def test_complete_hosts_file_is_not_rewritten(self):
+        rootfs_dir = os.path.join(self.test_dir, 'rootfs')
+        os.makedirs(rootfs_dir, exist_ok=True)
+        writable_storage = os.path.join(self.test_dir, 'writable_dirs')
+        os.makedirs(writable_storage, exist_ok=True)
+        host_hosts_path = os.path.join(writable_storage, 'etc_hosts')
+        Path(host_hosts_path).write_text('127.0.0.1 localhost box\n::1 ip6-localhost localhost\n', encoding='utf-8')
+        os.utime(host_hosts_path, ns=(0, 0))
+
+        bind_spec = self.runner._prepare_android_hosts_bind(rootfs_dir)
+        self.assertEqual(bind_spec, f"{host_hosts_path}:/etc/hosts")
+        self.assertEqual(os.stat(host_hosts_path).st_mtime_ns, 0)
 
 
 class TestAndroidResolvBind(unittest.TestCase):
     """测试Android resolv.conf绑定"""
 
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_resolv_')
+        self.test_dir = make_temp_dir(self, 'test_resolv_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
         self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(self.rootfs_dir, exist_ok=True)
 
-        self._orig_android = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
+        android_patcher = mock.patch(_DETECT_ANDROID, return_value=True)
+        self.detect_android = android_patcher.start()
+        self.addCleanup(android_patcher.stop)
 
         self._orig_get_dns = self.runner._get_android_dns_properties
 
     def tearDown(self):
-        self.runner._is_android_environment = self._orig_android
         self.runner._get_android_dns_properties = self._orig_get_dns
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
 
     def test_filters_loopback_and_uses_fallback_dns(self):
         self.runner._get_android_dns_properties = lambda: ['::1', '127.0.0.1']
@@ -228,6 +329,16 @@ class TestAndroidResolvBind(unittest.TestCase):
         self.assertNotIn('::1', content)
         self.assertNotIn('127.0.0.1', content)
 
+    def test_unchanged_resolv_is_not_rewritten(self):
+        expected_path = os.path.join(self.test_dir, 'writable_dirs', 'etc_resolv.conf')
+        self.runner._prepare_android_resolv_bind(self.rootfs_dir)
+        self.assertEqual(stat.S_IMODE(os.stat(expected_path).st_mode), 0o644)
+        self.assertFalse(os.path.exists(expected_path + '.tmp'))
+        os.utime(expected_path, ns=(0, 0))
+
+        self.runner._prepare_android_resolv_bind(self.rootfs_dir)
+        self.assertEqual(os.stat(expected_path).st_mtime_ns, 0)
+
     def test_build_proot_command_uses_generated_resolv_bind(self):
         os.makedirs(os.path.join(self.rootfs_dir, 'bin'), exist_ok=True)
         Path(os.path.join(self.rootfs_dir, 'bin', 'sh')).touch()
@@ -251,15 +362,16 @@ class TestAndroidFakeRootMode(unittest.TestCase):
     """Test Android default fake-root behavior and escape hatch."""
 
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_fakeroot_')
+        self.test_dir = make_temp_dir(self, 'test_fakeroot_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
         self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(self.rootfs_dir, 'bin'), exist_ok=True)
         Path(os.path.join(self.rootfs_dir, 'bin', 'sh')).touch()
         self.runner.rootfs_dir = self.rootfs_dir
 
-        self._orig_android = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
+        android_patcher = mock.patch(_DETECT_ANDROID, return_value=True)
+        self.detect_android = android_patcher.start()
+        self.addCleanup(android_patcher.stop)
 
         self._orig_env = os.environ.get(self.runner.FAKE_ROOT_ENV)
 
@@ -274,16 +386,11 @@ class TestAndroidFakeRootMode(unittest.TestCase):
         self.Args = Args
 
     def tearDown(self):
-        self.runner._is_android_environment = self._orig_android
-
         if self._orig_env is None:
             os.environ.pop(self.runner.FAKE_ROOT_ENV, None)
         else:
             os.environ[self.runner.FAKE_ROOT_ENV] = self._orig_env
 
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
-
     def test_android_defaults_to_fake_root(self):
         os.environ.pop(self.runner.FAKE_ROOT_ENV, None)
         cmd = self.runner._build_proot_command(self.Args())
@@ -309,27 +416,26 @@ class TestAndroidFakeRootMode(unittest.TestCase):
 
     def test_non_android_never_enables_fake_root(self):
         os.environ[self.runner.FAKE_ROOT_ENV] = '1'
-        self.runner._is_android_environment = lambda: False
+        self.detect_android.return_value = False
         cmd = self.runner._build_proot_command(self.Args())
         self.assertNotIn('-0', cmd, "Non-Android runs should not use fake-root by default")
 
 
 class TestAndroidSupervisordSocketPatch(unittest.TestCase):
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_supervisor_patch_')
+        self.test_dir = make_temp_dir(self, 'test_supervisor_patch_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
         self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(self.rootfs_dir, 'etc'), exist_ok=True)
 
-        self._orig_android = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
+        android_patcher = mock.patch(_DETECT_ANDROID, return_value=True)
+        self.detect_android = android_patcher.start()
+        self.addCleanup(android_patcher.stop)
 
         self._orig_enable_patches = os.environ.get(self.runner.ENABLE_IMAGE_PATCHES_ENV)
         self._orig_env = os.environ.get(self.runner.DISABLE_SUPERVISOR_SOCKET_PATCH_ENV)
 
     def tearDown(self):
-        self.runner._is_android_environment = self._orig_android
-
         if self._orig_enable_patches is None:
             os.environ.pop(self.runner.ENABLE_IMAGE_PATCHES_ENV, None)
         else:
@@ -340,8 +446,12 @@ class TestAndroidSupervisordSocketPatch(unittest.TestCase):
         else:
             os.environ[self.runner.DISABLE_SUPERVISOR_SOCKET_PATCH_ENV] = self._orig_env
 
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
+        for config_path in list(ProotRunner._supervisord_patch_cache):
+            if config_path.startswith(self.test_dir):
+                del ProotRunner._supervisord_patch_cache[config_path]
+        ProotRunner._supervisord_backups_written.difference_update(
+            [path for path in ProotRunner._supervisord_backups_written if path.startswith(self.test_dir)]
+        )
 
     def test_patches_supervisord_conf(self):
         conf_path = os.path.join(self.rootfs_dir, 'etc', 'supervisord.conf')
@@ -367,6 +477,32 @@ class TestAndroidSupervisordSocketPatch(unittest.TestCase):
         self.assertIn("port=127.0.0.1:9001", patched)
         self.assertIn("serverurl=http://127.0.0.1:9001", patched)
 
+        backup = Path(conf_path + '.android-docker-cli.bak').read_text(encoding='utf-8')
+        self.assertIn("[unix_http_server]", backup)
+        self.assertIn(conf_path, ProotRunner._supervisord_backups_written)
+
+    def test_unchanged_config_is_not_rescanned(self):
+        conf_path = os.path.join(self.rootfs_dir, 'etc', 'supervisord.conf')
+        Path(conf_path).write_text(
+            "[unix_http_server]\n"
+            "file=/var/run/supervisor.sock\n",
+            encoding='utf-8'
+        )
+        os.environ[self.runner.ENABLE_IMAGE_PATCHES_ENV] = '1'
+        self.runner._maybe_patch_supervisord_socket(self.rootfs_dir)
+        self.assertTrue(os.path.exists(conf_path + ProotRunner.SUPERVISORD_STAMP_SUFFIX))
+
+        # A fresh process only has the on-disk stamp to go on.
+        ProotRunner._supervisord_patch_cache.pop(conf_path, None)
+        calls = []
+        self.runner._patch_supervisord_config = lambda path: calls.append(path) or True
+        self.runner._maybe_patch_supervisord_socket(self.rootfs_dir)
+        self.assertEqual(calls, [])
+
+        Path(conf_path).write_text("[supervisord]\n", encoding='utf-8')
+        self.runner._maybe_patch_supervisord_socket(self.rootfs_dir)
+        self.assertEqual(calls, [conf_path])
+
     def test_can_disable_patch_via_env(self):
         conf_path = os.path.join(self.rootfs_dir, 'etc', 'supervisord.conf')
         Path(conf_path).write_text(
@@ -388,15 +524,16 @@ class TestAndroidLink2SymlinkMode(unittest.TestCase):
     """Test Android default link2symlink behavior and escape hatch."""
 
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_link2symlink_')
+        self.test_dir = make_temp_dir(self, 'test_link2symlink_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
         self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(self.rootfs_dir, 'bin'), exist_ok=True)
         Path(os.path.join(self.rootfs_dir, 'bin', 'sh')).touch()
         self.runner.rootfs_dir = self.rootfs_dir
 
-        self._orig_android = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
+        android_patcher = mock.patch(_DETECT_ANDROID, return_value=True)
+        self.detect_android = android_patcher.start()
+        self.addCleanup(android_patcher.stop)
 
         self._orig_env = os.environ.get(self.runner.LINK2SYMLINK_ENV)
         self._orig_supports = self.runner._proot_supports_link2symlink
@@ -413,7 +550,6 @@ class TestAndroidLink2SymlinkMode(unittest.TestCase):
         self.Args = Args
 
     def tearDown(self):
-        self.runner._is_android_environment = self._orig_android
         self.runner._proot_supports_link2symlink = self._orig_supports
 
         if self._orig_env is None:
@@ -421,9 +557,6 @@ class TestAndroidLink2SymlinkMode(unittest.TestCase):
         else:
             os.environ[self.runner.LINK2SYMLINK_ENV] = self._orig_env
 
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
-
     def test_android_defaults_to_link2symlink_when_supported(self):
         os.environ.pop(self.runner.LINK2SYMLINK_ENV, None)
         cmd = self.runner._build_proot_command(self.Args())
@@ -439,7 +572,7 @@ class TestNoShellEntrypointFallback(unittest.TestCase):
     """无shell镜像应直接执行Entrypoint，并保留用户环境变量注入。"""
 
     def setUp(self):
-        self.test_dir = tempfile.mkdtemp(prefix='test_noshell_entrypoint_')
+        self.test_dir = make_temp_dir(self, 'test_noshell_entrypoint_')
         self.runner = ProotRunner(cache_dir=self.test_dir)
         self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(os.path.join(self.rootfs_dir, 'app'), exist_ok=True)
@@ -451,8 +584,9 @@ class TestNoShellEntrypointFallback(unittest.TestCase):
                 "WorkingDir": "/app",
             }
         }
-        self._orig_android = self.runner._is_android_environment
-        self.runner._is_android_environment = lambda: True
+        android_patcher = mock.patch(_DETECT_ANDROID, return_value=True)
+        self.detect_android = android_patcher.start()
+        self.addCleanup(android_patcher.stop)
 
         class Args:
             detach = False
@@ -468,11 +602,6 @@ class TestNoShellEntrypointFallback(unittest.TestCase):
 
         self.Args = Args
 
-    def tearDown(self):
-        self.runner._is_android_environment = self._orig_android
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
-
     def test_build_proot_command_uses_direct_entrypoint_when_shell_missing(self):
         cmd = self.runner._build_proot_command(self.Args())
         self.assertIn('/app/server', cmd)
@@ -491,30 +620,39 @@ class TestNoShellEntrypointFallback(unittest.TestCase):
         self.assertEqual(env.get('CERBER_MODEL'), 'gpt-4o-mini')
         self.assertEqual(env.get('PATH'), baseline_env.get('PATH'))
 
+    def test_prepare_environment_inherits_when_unchanged(self):
+        self.detect_android.return_value = False
+        self.runner._container_env_overrides = {}
+        self.assertIsNone(self.runner._prepare_environment(allow_inherit=True))
+        self.assertEqual(self.runner._prepare_environment(), dict(os.environ))
+
 
-class TestCriticalFileValidation(unittest.TestCase):
+class TestCriticalFileValidation(SharedTempRootTestCase):
     """测试关键文件验证"""
+
+    temp_prefix = 'test_validation_'
+
+    _FIXTURE_DIRS = ('bin', 'lib', 'usr/bin')
+    _FIXTURE_FILES = ('bin/sh', 'lib/libc.so', 'usr/bin/ls')
     
     def setUp(self):
         """设置测试环境"""
-        self.test_dir = tempfile.mkdtemp(prefix='test_validation_')
-        self.image_processor = DockerImageToRootFS('test:latest', 
-                                                   output_path=os.path.join(self.test_dir, 'test.tar'))
-        self.image_processor.temp_dir = self.test_dir
-    
-    def tearDown(self):
-        """清理测试环境"""
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
+        self.test_dir = self.make_test_dir()
+        self.image_processor = self.make_image_processor(self.test_dir)
+
+    def _build_rootfs(self, dirs, files=()):
+        """创建rootfs目录树和空文件（os.open创建空文件，省去touch的utime调用）"""
+        rootfs = os.path.join(self.test_dir, 'rootfs')
+        for rel_dir in dirs:
+            os.makedirs(f'{rootfs}/{rel_dir}', exist_ok=True)
+        for rel_file in files:
+            os.close(os.open(f'{rootfs}/{rel_file}', os.O_CREAT | os.O_WRONLY, 0o644))
+        return rootfs
     
     def test_missing_shell(self):
         """测试缺少shell时的验证失败"""
-        rootfs = os.path.join(self.test_dir, 'rootfs')
-        os.makedirs(rootfs, exist_ok=True)
-        
         # 创建lib目录但不创建shell
-        os.makedirs(os.path.join(rootfs, 'lib'), exist_ok=True)
-        os.makedirs(os.path.join(rootfs, 'usr', 'bin'), exist_ok=True)
+        rootfs = self._build_rootfs(('lib', 'usr/bin'))
         
         missing = self.image_processor._validate_critical_files(rootfs)
         
@@ -523,17 +661,8 @@ class TestCriticalFileValidation(unittest.TestCase):
     
     def test_valid_rootfs(self):
         """测试有效的rootfs通过验证"""
-        rootfs = os.path.join(self.test_dir, 'rootfs')
-        os.makedirs(os.path.join(rootfs, 'bin'), exist_ok=True)
-        os.makedirs(os.path.join(rootfs, 'lib'), exist_ok=True)
-        os.makedirs(os.path.join(rootfs, 'usr', 'bin'), exist_ok=True)
-        
-        # 创建shell
-        Path(os.path.join(rootfs, 'bin', 'sh')).touch()
-        # 创建lib文件
-        Path(os.path.join(rootfs, 'lib', 'libc.so')).touch()
-        # 创建usr/bin文件
-        Path(os.path.join(rootfs, 'usr', 'bin', 'ls')).touch()
+        # 创建shell、lib文件和usr/bin文件
+        rootfs = self._build_rootfs(self._FIXTURE_DIRS, self._FIXTURE_FILES)
         
         missing = self.image_processor._validate_critical_files(rootfs)
         
@@ -541,57 +670,61 @@ class TestCriticalFileValidation(unittest.TestCase):
         self.assertEqual(len(missing), 0)
 
 
-class TestAndroidDetection(unittest.TestCase):
+class TestAndroidDetection(SharedTempRootTestCase):
     """测试Android环境检测"""
+
+    temp_prefix = 'test_detection_'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shared_runner = ProotRunner(cache_dir=cls._root)
+        cls.shared_processor = cls.make_image_processor(cls._root)
     
-    @given(st.booleans())
-    @settings(max_examples=50)
-    def test_android_detection_consistency(self, mock_android):
+    def test_android_detection_consistency(self):
         """
         Property 9: Android环境自动检测
         Validates: Requirements 4.1, 4.2, 4.3, 4.4
         
         对于任意环境状态，两个模块的Android检测应该一致
         """
-        runner = ProotRunner()
-        image_processor = DockerImageToRootFS('test:latest')
+        runner = self.shared_runner
+        image_processor = self.shared_processor
         
-        # 在实际环境中，两个检测方法应该返回相同的结果
-        runner_result = runner._is_android_environment()
-        processor_result = image_processor._is_android_environment()
+        # 真实探测：两个模块的结果应该一致
+        self.assertIs(runner._is_android_environment(), image_processor._is_android_environment())
         
-        # 两个模块应该有一致的检测结果
-        self.assertEqual(type(runner_result), type(processor_result))
-        self.assertIsInstance(runner_result, bool)
-        self.assertIsInstance(processor_result, bool)
+        # 两个模块共用create_rootfs_tar中的同一个缓存探测，打一个补丁即可
+        for mock_android in (True, False):
+            with self.subTest(mock_android=mock_android), \
+                    mock.patch(_DETECT_ANDROID, return_value=mock_android):
+                self.assertIs(runner._is_android_environment(), mock_android)
+                self.assertIs(image_processor._is_android_environment(), mock_android)
 
 
 class TestVersionDetection(unittest.TestCase):
     """测试版本检测功能"""
     
-    @given(st.sampled_from(['v1.0.0', 'v1.1.0', 'v2.0.0', 'v10.5.3']))
-    @settings(max_examples=50)
-    def test_version_pattern_extraction(self, version):
+    def test_version_pattern_extraction(self):
         """
         Property 13: 版本检测
         Validates: Requirements 6.1, 6.2
         
         对于任意有效的版本字符串，应该能够正确提取版本号
         """
-        # 模拟URL中的版本
-        url = f"https://raw.githubusercontent.com/user/repo/{version}/scripts/install.sh"
-        
-        # 提取版本的正则表达式模式
-        import re
-        match = re.search(r'/v\d+\.\d+\.\d+/', url)
-        
-        if match:
-            extracted = match.group(0).strip('/')
-            self.assertEqual(extracted, version)
+        for version in ('v1.0.0', 'v1.1.0', 'v2.0.0', 'v10.5.3'):
+            with self.subTest(version=version):
+                # 模拟URL中的版本
+                url = f"https://raw.githubusercontent.com/user/repo/{version}/scripts/install.sh"
+                match = _VERSION_RE.search(url)
+                self.assertIsNotNone(match)
+                self.assertEqual(match.group(0).strip('/'), version)
 
 
-class TestExtractionResilience(unittest.TestCase):
+class TestExtractionResilience(SharedTempRootTestCase):
     """测试提取弹性"""
+
+    temp_prefix = 'test_resilience_'
     
     def test_tar_exit_code_handling(self):
         """
@@ -600,30 +733,43 @@ class TestExtractionResilience(unittest.TestCase):
         
         tar退出码2（警告）应该被视为成功
         """
-        # 退出码0和2都应该被接受
-        acceptable_codes = [0, 2]
-        
-        for code in acceptable_codes:
-            self.assertIn(code, [0, 2], 
-                         f"退出码 {code} 应该被接受")
+        test_dir = self.make_test_dir()
+        image_processor = self.make_image_processor(test_dir)
+        layer_path = os.path.join(test_dir, 'layer.tar')
+        Path(layer_path).write_bytes(b'\0' * 1024)
+
+        # 退出码0和2都应该被接受，其他退出码走回退路径
+        for code, expect_fallback in ((0, False), (2, False), (1, True), (128, True)):
+            with self.subTest(code=code), \
+                    mock.patch('android_docker.create_rootfs_tar.subprocess.run',
+                               return_value=subprocess.CompletedProcess([], code, '', '')), \
+                    mock.patch.object(image_processor, '_extract_with_fallback') as fallback:
+                image_processor._extract_layer_with_tar(layer_path, test_dir)
+                self.assertEqual(fallback.called, expect_fallback)
+
+
+class TestAndroidExtractionPermissions(SharedTempRootTestCase):
+    """测试Android提取权限保留"""
 
+    temp_prefix = 'test_exec_'
 
-class TestAndroidExtractionPermissions(unittest.TestCase):
-    """测试Android提取权限保留"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 归档内容固定，只在内存中构建一次
+        data = b'#!/bin/sh\necho hello\n'
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w', format=tarfile.USTAR_FORMAT) as tar:
+            info = tarfile.TarInfo(name='bin/busybox')
+            info.mode = 0o755
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        cls._layer_tar_bytes = buffer.getvalue()
 
     def setUp(self):
         """设置测试环境"""
-        self.test_dir = tempfile.mkdtemp(prefix='test_exec_')
-        self.image_processor = DockerImageToRootFS(
-            'test:latest',
-            output_path=os.path.join(self.test_dir, 'test.tar')
-        )
-        self.image_processor.temp_dir = self.test_dir
-
-    def tearDown(self):
-        """清理测试环境"""
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
+        self.test_dir = self.make_test_dir()
+        self.image_processor = self.make_image_processor(self.test_dir)
 
     def test_android_executable_bit_preserved(self):
         """Android环境下应保留可执行文件的执行位"""
@@ -633,22 +779,10 @@ class TestAndroidExtractionPermissions(unittest.TestCase):
         rootfs = os.path.join(self.test_dir, 'rootfs')
         os.makedirs(rootfs, exist_ok=True)
 
-        tar_path = os.path.join(self.test_dir, 'layer.tar')
-        data = b'#!/bin/sh\necho hello\n'
-
-        with tarfile.open(tar_path, 'w') as tar:
-            info = tarfile.TarInfo(name='bin/busybox')
-            info.mode = 0o755
-            info.size = len(data)
-            tar.addfile(info, io.BytesIO(data))
-
-        original_method = self.image_processor._is_android_environment
-        self.image_processor._is_android_environment = lambda: True
-        try:
-            with tarfile.open(tar_path, 'r') as tar:
+        with mock.patch(_DETECT_ANDROID, return_value=True):
+            with tarfile.open(fileobj=io.BytesIO(self._layer_tar_bytes), mode='r',
+                              copybufsize=_TAR_COPY_BUFSIZE) as tar:
                 self.image_processor._safe_extract_tar(tar, rootfs)
-        finally:
-            self.image_processor._is_android_environment = original_method
 
         extracted_path = os.path.join(rootfs, 'bin', 'busybox')
         self.assertTrue(os.path.exists(extracted_path), "busybox应该被提取")
@@ -656,17 +790,14 @@ class TestAndroidExtractionPermissions(unittest.TestCase):
         self.assertTrue(mode & stat.S_IXUSR, "busybox应该是可执行文件")
 
 
-class TestContainerCleanup(unittest.TestCase):
+class TestContainerCleanup(SharedTempRootTestCase):
     """测试容器清理"""
+
+    temp_prefix = 'test_cleanup_'
     
     def setUp(self):
         """设置测试环境"""
-        self.test_dir = tempfile.mkdtemp(prefix='test_cleanup_')
-    
-    def tearDown(self):
-        """清理测试环境"""
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
+        self.test_dir = self.make_test_dir()
     
     def test_writable_dirs_cleanup(self):
         """
@@ -675,26 +806,26 @@ class TestContainerCleanup(unittest.TestCase):
         
         当容器被删除时，writable_dirs应该被清理
         """
-        container_dir = os.path.join(self.test_dir, 'containers', 'test_container')
-        writable_dirs = os.path.join(os.path.dirname(container_dir), 'writable_dirs')
+        parent = Path(self.test_dir, 'containers')
+        container_dir = parent / 'test_container'
+        writable_dirs = parent / 'writable_dirs'
         
         # 创建目录
-        os.makedirs(container_dir, exist_ok=True)
-        os.makedirs(writable_dirs, exist_ok=True)
+        parent.mkdir()
+        container_dir.mkdir()
+        writable_dirs.mkdir()
         
         # 验证目录存在
-        self.assertTrue(os.path.exists(container_dir))
-        self.assertTrue(os.path.exists(writable_dirs))
+        with os.scandir(parent) as it:
+            self.assertEqual({entry.name for entry in it}, {'test_container', 'writable_dirs'})
         
-        # 模拟清理
-        if os.path.isdir(container_dir):
-            shutil.rmtree(container_dir)
-        if os.path.isdir(writable_dirs):
-            shutil.rmtree(writable_dirs)
+        # 模拟清理（目录为空，直接rmdir）
+        os.rmdir(container_dir)
+        os.rmdir(writable_dirs)
         
         # 验证目录被删除
-        self.assertFalse(os.path.exists(container_dir))
-        self.assertFalse(os.path.exists(writable_dirs))
+        with os.scandir(parent) as it:
+            self.assertEqual(list(it), [])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+"""
+Tests for the persistent exec session
+"""
+
+import json
+import os
+import subprocess
+import unittest
+
+from android_docker.exec_session import ExecSession, SESSION_LOOP, stdin_is_idle
+from tests.support import make_temp_dir
+
+
+class TestExecSession(unittest.TestCase):
+    """Exercise the session protocol with a host shell standing in for proot."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, "test_exec_session_")
+        self.session = ExecSession(self.test_dir)
+        self.session._session_command = lambda proot_cmd, shell: [
+            shell, "-c", SESSION_LOOP, self.session.session_dir
+        ]
+        self.session.start([], "/bin/sh")
+
+    def tearDown(self):
+        self.session.stop()
+
+    def test_runs_commands_and_reports_exit_status(self):
+        self.assertEqual(self.session.run(["echo", "hello world"]), (0, b"hello world\n"))
+        self.assertEqual(
+            self.session.run(["sh", "-c", "echo err >&2; printf partial; exit 3"]),
+            (3, b"err\npartial"),
+        )
+
+    def test_arguments_are_not_reinterpreted(self):
+        self.assertEqual(self.session.run(["echo", "$HOME", "it's"]), (0, b"$HOME it's\n"))
+
+    def test_second_client_reuses_running_session(self):
+        client = ExecSession(self.test_dir)
+        self.assertTrue(client.is_running())
+        exit_code, _ = client.run(["true"])
+        self.assertEqual(exit_code, 0)
+
+    def test_multiline_arguments_fall_back(self):
+        self.assertIsNone(self.session.run(["echo", "a\nb"]))
+
+    def test_stop_terminates_session(self):
+        self.session.stop()
+        self.assertFalse(ExecSession(self.test_dir).is_running())
+        self.assertIsNone(self.session.run(["true"]))
+
+
+class TestStaleSessionState(unittest.TestCase):
+    """A session.json left behind by a dead session must not match a process that reused its pid."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, "test_stale_session_")
+        self.session = ExecSession(self.test_dir)
+        os.makedirs(self.session.session_dir)
+        # An unrelated process leading its own group, as an interactive shell would.
+        self.other = subprocess.Popen(["sleep", "30"], start_new_session=True)
+        self.addCleanup(self.other.wait)
+        self.addCleanup(self.other.kill)
+
+    def _write_state(self, state):
+        with open(self.session.state_file, "w") as f:
+            json.dump(state, f)
+
+    def test_reused_pid_is_not_running_and_not_signalled(self):
+        self._write_state({"pid": self.other.pid, "start_time": 0})
+        self.assertFalse(self.session.is_running())
+
+        self.session.stop()
+        self.assertIsNone(self.other.poll())
+        self.assertFalse(os.path.exists(self.session.state_file))
+
+    def test_state_without_start_time_is_ignored(self):
+        self._write_state({"pid": self.other.pid, "started": 0})
+        self.assertFalse(self.session.is_running())
+
+
+class TestStdinIsIdle(unittest.TestCase):
+    """Only stdin without readable input may be served by the session."""
+
+    def test_classification(self):
+        test_dir = make_temp_dir(self, "test_stdin_idle_")
+        empty = os.path.join(test_dir, "empty")
+        data = os.path.join(test_dir, "data")
+        with open(empty, "w"):
+            pass
+        with open(data, "w") as f:
+            f.write("x\n")
+
+        with open(os.devnull, "rb") as devnull, open(empty, "rb") as empty_f, open(data, "rb") as data_f:
+            self.assertTrue(stdin_is_idle(devnull.fileno()))
+            self.assertTrue(stdin_is_idle(empty_f.fileno()))
+            self.assertFalse(stdin_is_idle(data_f.fileno()))
+
+        read_fd, write_fd = os.pipe()
+        try:
+            self.assertFalse(stdin_is_idle(read_fd))
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+
+if __name__ == "__main__":
+    unittest.main()
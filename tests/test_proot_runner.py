@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ProotRunner helpers
+"""
+
+import atexit
+import io
+import os
+import signal
+import stat
+import subprocess
+import sys
+import tarfile
+import time
+import unittest
+from pathlib import Path
+
+from android_docker import create_rootfs_tar
+from android_docker.proot_runner import ProotRunner, _strip_termux_libexec
+from tests.support import make_temp_dir
+
+
+class TestShellDiscovery(unittest.TestCase):
+    """Shell lookup reads <rootfs>/bin once and prefers bash, then sh, then busybox."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_shell_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
+        os.makedirs(os.path.join(self.rootfs_dir, 'bin'), exist_ok=True)
+        self.runner.rootfs_dir = self.rootfs_dir
+
+    def test_prefers_sh_over_busybox(self):
+        Path(os.path.join(self.rootfs_dir, 'bin', 'busybox')).touch()
+        Path(os.path.join(self.rootfs_dir, 'bin', 'sh')).touch()
+        self.assertEqual(self.runner._get_available_shell(), '/bin/sh')
+        self.assertEqual(self.runner._get_default_command(), ['/bin/sh'])
+
+    def test_busybox_fallback(self):
+        Path(os.path.join(self.rootfs_dir, 'bin', 'busybox')).touch()
+        self.assertEqual(self.runner._get_available_shell(), '/bin/busybox')
+        self.assertEqual(self.runner._get_default_command(), ['/bin/busybox', 'sh'])
+
+    def test_listing_is_reread_for_new_rootfs(self):
+        self.assertIsNone(self.runner._get_available_shell())
+        other_rootfs = os.path.join(self.test_dir, 'other_rootfs')
+        os.makedirs(os.path.join(other_rootfs, 'bin'), exist_ok=True)
+        Path(os.path.join(other_rootfs, 'bin', 'bash')).touch()
+        self.runner.rootfs_dir = other_rootfs
+        self.assertEqual(self.runner._get_available_shell(), '/bin/bash')
+
+
+class TestImageConfigCache(unittest.TestCase):
+    """Parsed image config is reused until the file changes."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_image_config_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.runner.rootfs_dir = os.path.join(self.test_dir, 'rootfs')
+        os.makedirs(self.runner.rootfs_dir, exist_ok=True)
+        self.config_path = os.path.join(self.runner.rootfs_dir, '.image_config.json')
+
+    def tearDown(self):
+        ProotRunner._image_config_cache.pop(self.config_path, None)
+
+    def test_reload_after_change(self):
+        Path(self.config_path).write_text('{"config": {"Cmd": ["a"]}}', encoding='utf-8')
+        self.assertTrue(self.runner._find_image_config())
+        self.assertEqual(self.runner.config_data['config']['Cmd'], ['a'])
+
+        Path(self.config_path).write_text('{"config": {"Cmd": ["bb"]}}', encoding='utf-8')
+        self.assertTrue(self.runner._find_image_config())
+        self.assertEqual(self.runner.config_data['config']['Cmd'], ['bb'])
+
+    def test_missing_config(self):
+        self.assertFalse(self.runner._find_image_config())
+
+
+class TestInProcessDownload(unittest.TestCase):
+    """create_rootfs_tar runs in-process without leaking proxy settings."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_inproc_download_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.saved_env = {key: os.environ.get(key) for key in ('https_proxy', 'http_proxy')}
+        self.original_main = create_rootfs_tar.main
+
+    def tearDown(self):
+        create_rootfs_tar.main = self.original_main
+        for key, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    def _fake_main(self, exit_code):
+        def fake_main(argv):
+            self.argv = argv
+            os.environ['http_proxy'] = 'http://proxy.invalid:3128'
+            sys.exit(exit_code)
+        return fake_main
+
+    def test_success_and_proxy_restored(self):
+        os.environ.pop('http_proxy', None)
+        create_rootfs_tar.main = self._fake_main(0)
+        self.assertTrue(self.runner._run_create_rootfs_tar(['-o', 'out.tar', 'alpine:latest']))
+        self.assertEqual(self.argv, ['-o', 'out.tar', 'alpine:latest'])
+        self.assertNotIn('http_proxy', os.environ)
+
+    def test_failure_exit_code(self):
+        create_rootfs_tar.main = self._fake_main(1)
+        self.assertFalse(self.runner._run_create_rootfs_tar(['alpine:latest']))
+
+
+class TestCacheInfo(unittest.TestCase):
+    """Cache info written in this process is served without re-parsing."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_cache_info_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.image_url = 'alpine:latest'
+        self.info_path = self.runner._get_cache_info_path(self.image_url)
+
+    def tearDown(self):
+        ProotRunner._cache_info_cache.pop(self.info_path, None)
+
+    def test_saved_info_reused_until_file_changes(self):
+        self.runner._save_cache_info(self.image_url, '/cache/alpine.tar.gz')
+        info = self.runner._load_cache_info(self.image_url)
+        self.assertEqual(info['image_url'], self.image_url)
+        self.assertIs(self.runner._load_cache_info(self.image_url), info)
+
+        Path(self.info_path).write_text('{"image_url": "other:tag"}', encoding='utf-8')
+        self.assertEqual(self.runner._load_cache_info(self.image_url)['image_url'], 'other:tag')
+
+    def test_missing_info(self):
+        self.assertIsNone(self.runner._load_cache_info(self.image_url))
+
+    def test_clear_all_caches(self):
+        cache_path = self.runner._get_image_cache_path(self.image_url)
+        Path(cache_path).write_bytes(b'layer')
+        self.runner._save_cache_info(self.image_url, cache_path)
+
+        self.runner.clear_cache()
+
+        self.assertEqual(os.listdir(self.test_dir), [])
+        self.assertIsNone(self.runner._load_cache_info(self.image_url))
+
+
+class TestStartupScript(unittest.TestCase):
+    """Startup script passes the command through as argv, without re-parsing."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_startup_script_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.runner.rootfs_dir = self.test_dir
+
+    def test_arguments_survive_verbatim(self):
+        command = ['printf', '%s|', 'a b', '$HOME', "it's", '*']
+        self.runner._create_startup_script({'GREETING': 'hi'}, command, available_shell='/bin/sh')
+        script_path = os.path.join(self.test_dir, 'startup.sh')
+        result = subprocess.run(['/bin/sh', script_path], capture_output=True, text=True, cwd=self.test_dir)
+        self.assertEqual(result.stdout, "a b|$HOME|it's|*|")
+
+    def test_script_is_executable(self):
+        script_path = os.path.join(self.test_dir, 'startup.sh')
+        Path(script_path).write_text('stale contents that are longer than the script\n')
+        os.chmod(script_path, 0o600)
+        self.runner._create_startup_script({}, ['true'], available_shell='/bin/sh')
+        self.assertEqual(stat.S_IMODE(os.stat(script_path).st_mode), 0o755)
+        self.assertTrue(Path(script_path).read_text().endswith('exec "$@"\n'))
+
+
+class TestImageUrlDetection(unittest.TestCase):
+    """Image references are told apart from local tarballs and rootfs directories."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_image_url_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+
+    def test_classification(self):
+        cases = {
+            'docker.io/library/alpine:latest': True,
+            'alpine:latest': True,
+            'alpine': True,
+            'images/alpine.tar': False,
+            'alpine.tar.gz': False,
+            self.test_dir: False,
+            './rootfs': False,
+            '../rootfs': False,
+        }
+        for input_str, expected in cases.items():
+            with self.subTest(input_str=input_str):
+                self.assertEqual(self.runner._is_image_url(input_str), expected)
+
+    def test_same_named_entry_in_cwd_is_not_a_rootfs(self):
+        os.mkdir(os.path.join(self.test_dir, 'nginx'))
+        Path(self.test_dir, 'redis').write_text('not a rootfs\n')
+        cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.addCleanup(os.chdir, cwd)
+
+        self.assertTrue(self.runner._is_image_url('nginx'))
+        self.assertTrue(self.runner._is_image_url('redis'))
+        self.assertFalse(self.runner._is_image_url('./nginx'))
+
+
+class TestScratchRoot(unittest.TestCase):
+    """Temporary extractions share one scratch root per runner."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_scratch_root_')
+        self.runner = ProotRunner(cache_dir=self.test_dir)
+        self.tar_path = os.path.join(self.test_dir, 'rootfs.tar')
+        with tarfile.open(self.tar_path, 'w') as tar:
+            info = tarfile.TarInfo('etc/hostname')
+            data = b'container\n'
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    def tearDown(self):
+        self.runner._remove_scratch_root()
+        atexit.unregister(self.runner._remove_scratch_root)
+
+    def test_runs_share_scratch_root(self):
+        first = self.runner._extract_rootfs_if_needed(self.tar_path)
+        first_temp = self.runner.temp_dir
+        scratch_root = self.runner._scratch_root
+        second = self.runner._extract_rootfs_if_needed(self.tar_path)
+
+        self.assertNotEqual(first, second)
+        for rootfs in (first, second):
+            self.assertEqual(os.path.dirname(os.path.dirname(rootfs)), scratch_root)
+            self.assertTrue(os.path.isfile(os.path.join(rootfs, 'etc', 'hostname')))
+
+        self.runner._cleanup()
+        self.assertFalse(os.path.exists(self.runner.temp_dir))
+        self.assertTrue(os.path.exists(first_temp))
+        self.runner._remove_scratch_root()
+        self.assertFalse(os.path.exists(scratch_root))
+
+    def test_scratch_root_survives_cache_purge(self):
+        rootfs = self.runner._extract_rootfs_if_needed(self.tar_path)
+
+        self.assertFalse(rootfs.startswith(self.test_dir + os.sep))
+        ProotRunner(cache_dir=self.test_dir).clear_cache()
+        self.assertTrue(os.path.isfile(os.path.join(rootfs, 'etc', 'hostname')))
+
+    def test_scratch_roots_are_per_instance(self):
+        other = ProotRunner(cache_dir=self.test_dir)
+        self.addCleanup(atexit.unregister, other._remove_scratch_root)
+        self.addCleanup(other._remove_scratch_root)
+        self.runner._extract_rootfs_if_needed(self.tar_path)
+        other._extract_rootfs_if_needed(self.tar_path)
+
+        self.assertNotEqual(self.runner._scratch_root, other._scratch_root)
+        other._remove_scratch_root()
+        self.assertTrue(os.path.isdir(self.runner.temp_dir))
+
+
+class TestAndroidDnsProperties(unittest.TestCase):
+    """DNS properties come from a single `getprop` listing."""
+
+    def test_parses_dns_keys_in_order(self):
+        output = (
+            "[net.bt.name]: [Android]\n"
+            "[net.dns2]: [8.8.4.4]\n"
+            "[net.dns1]: [1.1.1.1]\n"
+            "[net.dns3]: []\n"
+            "[persist.net.dns1]: [9.9.9.9]\n"
+        )
+        self.assertEqual(
+            ProotRunner._parse_getprop_output(output, ProotRunner.ANDROID_DNS_PROPERTIES),
+            ['1.1.1.1', '8.8.4.4'],
+        )
+
+
+class TestTermuxPathFilter(unittest.TestCase):
+    """Termux libexec entries are dropped from PATH; everything else is kept verbatim."""
+
+    def test_matches_split_and_filter(self):
+        libexec = '/data/data/com.termux/files/usr/libexec'
+        for path_value in (
+            '',
+            libexec,
+            f'{libexec}/termux:/usr/bin',
+            f'/usr/bin:{libexec}:/bin',
+            f'/usr/bin::{libexec}',
+            '/usr/bin:/bin',
+        ):
+            with self.subTest(path_value=path_value):
+                expected = ':'.join(
+                    part for part in path_value.split(':') if not part.startswith(libexec)
+                )
+                self.assertEqual(_strip_termux_libexec(path_value), expected)
+
+
+class TestDetachedSpawn(unittest.TestCase):
+    """Detached containers start in their own session with output sent to the log file."""
+
+    def setUp(self):
+        self.test_dir = make_temp_dir(self, 'test_detached_spawn_')
+
+    def test_spawn_in_new_session_with_log(self):
+        log_path = os.path.join(self.test_dir, 'container.log')
+        with open(log_path, 'a') as log_file:
+            pid = ProotRunner._spawn_detached(
+                ['sh', '-c', 'echo out; echo err >&2; read line || echo no-stdin; sleep 5'],
+                os.environ, log_file,
+            )
+        if pid is None:
+            self.skipTest('posix_spawn cannot create a session on this platform')
+        try:
+            self.assertEqual(os.getsid(pid), pid)
+            deadline = time.monotonic() + 5
+            while 'no-stdin' not in Path(log_path).read_text() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(Path(log_path).read_text().split(), ['out', 'err', 'no-stdin'])
+        finally:
+            os.killpg(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+    def test_executable_resolved_from_child_path(self):
+        bin_dir = os.path.join(self.test_dir, 'bin')
+        os.mkdir(bin_dir)
+        tool = os.path.join(bin_dir, 'container-only-tool')
+        Path(tool).write_text('#!/bin/sh\nexit 7\n')
+        os.chmod(tool, 0o755)
+        env = dict(os.environ, PATH=f'{bin_dir}:/usr/bin:/bin')
+
+        pid = ProotRunner._spawn_detached(['container-only-tool'], env)
+        if pid is None:
+            self.skipTest('posix_spawn cannot create a session on this platform')
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 7)
+
+        with self.assertRaises(FileNotFoundError):
+            ProotRunner._spawn_detached(['container-only-tool'], dict(os.environ, PATH='/usr/bin:/bin'))
+
+
+if __name__ == '__main__':
+    unittest.main()